@@ -0,0 +1,279 @@
+import re
+import json
+import os
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from merge_tvlist import extract_m3u
+
+# history 中每次构建的快照（logoMMDDHHMM.m3u），tvbox_*.txt 与其同源，不重复统计
+HISTORY_DIR = Path("history")
+SNAPSHOT_PATTERN = re.compile(r"^logo(\d{8})\.m3u$")
+
+# 索引目录：位矩阵以 memmap 方式持久化，每次只追加新快照
+AVAIL_DIR = Path("md/availability")
+BITS_FILE = "bits.npy"
+URLS_FILE = "urls.txt"
+META_FILE = "meta.json"
+REPORT_FILE = "report.txt"
+
+# 位矩阵初始容量（行=快照，列=链接），不够时翻倍扩容
+INITIAL_ROWS = 256
+INITIAL_COLS = 8192
+# 查询时每次只解包这么多行，内存与快照数无关
+CHUNK_ROWS = 64
+
+tvg_name_pattern = re.compile(r'tvg-name="([^"]*)"')
+
+def chronological(stamps):
+    """把不带年份的 MMDDHHMM 时间戳排成时间顺序
+
+    history 跨年时 01xxxxxx 实际晚于 12xxxxxx：按年内位置排序后，
+    从环形上最大的时间空档之后开始，即为最早的快照。
+    """
+    def minute_of_year(stamp):
+        month, day, hour, minute = (int(stamp[i:i + 2]) for i in range(0, 8, 2))
+        return (((month - 1) * 31 + day - 1) * 24 + hour) * 60 + minute
+
+    ordered = sorted(stamps, key=minute_of_year)
+    if len(ordered) < 2:
+        return ordered
+    year = 12 * 31 * 24 * 60
+    points = [minute_of_year(stamp) for stamp in ordered]
+    gaps = [b - a for a, b in zip(points, points[1:])] + [points[0] + year - points[-1]]
+    start = (gaps.index(max(gaps)) + 1) % len(ordered)
+    return ordered[start:] + ordered[:start]
+
+class AvailabilityIndex:
+    """快照 × 链接 的位矩阵：第 i 次构建中出现了第 j 个链接，则 bits[i, j] = 1
+
+    链接按首次出现顺序驻留（intern）为列号，并记录首次出现时的频道名；
+    矩阵按行打包为 uint8（每字节 8 个链接），保存在 bits.npy 中并以 memmap 打开。
+    """
+
+    def __init__(self, root: Path = AVAIL_DIR):
+        self.root = Path(root)
+        self.snapshots = []
+        self.urls = []
+        self.channels = []
+        self.url_ids = {}
+        self.bits = None
+        meta_path = self.root / META_FILE
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            self.snapshots = meta["snapshots"]
+            with open(self.root / URLS_FILE, encoding="utf-8", newline="\n") as f:
+                for line in f:
+                    url, _, channel = line.rstrip("\n").partition("\t")
+                    self.url_ids[url] = len(self.urls)
+                    self.urls.append(url)
+                    self.channels.append(channel)
+            self.bits = np.load(self.root / BITS_FILE, mmap_mode="r+")
+
+    def _ensure_capacity(self, rows: int, cols: int):
+        """保证位矩阵至少有 rows 行、cols 列，不够则翻倍扩容并重写文件"""
+        cur_rows, cur_bytes = self.bits.shape if self.bits is not None else (0, 0)
+        if rows <= cur_rows and cols <= cur_bytes * 8:
+            return
+        new_rows = max(cur_rows, INITIAL_ROWS)
+        while new_rows < rows:
+            new_rows *= 2
+        new_cols = max(cur_bytes * 8, INITIAL_COLS)
+        while new_cols < cols:
+            new_cols *= 2
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / (BITS_FILE + ".tmp")
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(new_rows, new_cols // 8))
+        if self.bits is not None:
+            grown[:cur_rows, :cur_bytes] = self.bits
+        grown.flush()
+        del grown
+        self.bits = None
+        os.replace(tmp_path, self.root / BITS_FILE)
+        self.bits = np.load(self.root / BITS_FILE, mmap_mode="r+")
+
+    def add_snapshot(self, name: str, entries):
+        """追加一次快照，entries 为 (频道名, 链接) 序列"""
+        new_urls = []
+        cols = []
+        for channel, url in entries:
+            col = self.url_ids.get(url)
+            if col is None:
+                col = len(self.urls)
+                self.url_ids[url] = col
+                self.urls.append(url)
+                self.channels.append(channel)
+                new_urls.append((url, channel))
+            cols.append(col)
+
+        row = len(self.snapshots)
+        self._ensure_capacity(row + 1, len(self.urls))
+        cols = np.asarray(cols, dtype=np.int64)
+        packed = np.zeros(self.bits.shape[1], dtype=np.uint8)
+        np.bitwise_or.at(packed, cols >> 3, (1 << (cols & 7)).astype(np.uint8))
+        self.bits[row] = packed
+        self.snapshots.append(name)
+
+        if new_urls:
+            with open(self.root / URLS_FILE, "a", encoding="utf-8", newline="\n") as f:
+                f.writelines(f"{url}\t{channel}\n" for url, channel in new_urls)
+
+    def save(self):
+        if self.bits is not None:
+            self.bits.flush()
+        self.root.mkdir(parents=True, exist_ok=True)
+        (self.root / META_FILE).write_text(json.dumps({"snapshots": self.snapshots}, ensure_ascii=False), encoding="utf-8")
+
+    def update(self, history_dir: Path = HISTORY_DIR) -> int:
+        """把 history 中尚未收录的快照按时间戳顺序追加进来，返回新增快照数"""
+        known = set(self.snapshots)
+        pending = {}
+        for f in Path(history_dir).glob("logo*.m3u"):
+            match = SNAPSHOT_PATTERN.match(f.name)
+            if match and f.name not in known:
+                pending[match.group(1)] = f
+
+        for stamp in chronological(pending):
+            f = pending[stamp]
+            entries = []
+            for extinf, url in extract_m3u(f):
+                name_match = tvg_name_pattern.search(extinf)
+                channel = name_match.group(1) if name_match else extinf.rsplit(",", 1)[-1].strip()
+                entries.append((channel, url.strip()))
+            self.add_snapshot(f.name, entries)
+
+        if pending:
+            self.save()
+        return len(pending)
+
+    def _unpack(self, start: int, stop: int) -> np.ndarray:
+        """解包第 start~stop 行为布尔矩阵 (行数, 链接数)"""
+        return np.unpackbits(self.bits[start:stop], axis=1, count=len(self.urls), bitorder="little").view(bool)
+
+    def iter_chunks(self):
+        """按 CHUNK_ROWS 行分块解包，产出 (起始行号, 布尔块)"""
+        for start in range(0, len(self.snapshots), CHUNK_ROWS):
+            yield start, self._unpack(start, min(start + CHUNK_ROWS, len(self.snapshots)))
+
+    def matrix(self) -> np.ndarray:
+        """解包为完整的布尔矩阵 (快照数, 链接数)，仅用于调试和测试；统计查询都按块计算"""
+        return self._unpack(0, len(self.snapshots))
+
+    def column_stats(self):
+        """每个链接出现的快照数和首次出现的行号"""
+        counts = np.zeros(len(self.urls), dtype=np.int64)
+        first_seen = np.full(len(self.urls), len(self.snapshots), dtype=np.int64)
+        for start, chunk in self.iter_chunks():
+            counts += chunk.sum(axis=0)
+            fresh = (first_seen == len(self.snapshots)) & chunk.any(axis=0)
+            first_seen[fresh] = start + chunk[:, fresh].argmax(axis=0)
+        return counts, first_seen
+
+    def uptime(self) -> np.ndarray:
+        """每个链接自首次出现以来的在线率（0~1）"""
+        if not self.snapshots:
+            return np.zeros(len(self.urls))
+        counts, first_seen = self.column_stats()
+        return counts / np.maximum(len(self.snapshots) - first_seen, 1)
+
+    def uptime_map(self) -> dict:
+        """链接 -> 在线率，供 merge_tvlist 排序使用"""
+        return dict(zip(self.urls, self.uptime().tolist()))
+
+    def flapping_hosts(self, top: int = 20):
+        """按主机统计上下线切换次数，返回 [(主机, 平均每链接切换次数, 链接数)]
+
+        链接首次出现（0→1）不算切换，只统计首次出现之后的上下线变化。
+        """
+        if len(self.snapshots) < 2:
+            return []
+        flips = np.zeros(len(self.urls), dtype=np.int64)
+        prev = np.zeros(len(self.urls), dtype=bool)
+        seen = np.zeros(len(self.urls), dtype=bool)
+        for _, chunk in self.iter_chunks():
+            rows = np.vstack([prev[None, :], chunk])
+            # 每一行之前是否已经出现过：只有之后的变化才计入
+            seen_before = np.logical_or.accumulate(rows, axis=0)[:-1] | seen
+            flips += np.count_nonzero((rows[1:] != rows[:-1]) & seen_before, axis=0)
+            seen |= chunk.any(axis=0)
+            prev = chunk[-1]
+        hosts, host_ids = np.unique([urlsplit(url).netloc for url in self.urls], return_inverse=True)
+        host_flips = np.bincount(host_ids, weights=flips, minlength=len(hosts))
+        host_urls = np.bincount(host_ids, minlength=len(hosts))
+        rate = host_flips / host_urls
+        order = np.argsort(-rate, kind="stable")[:top]
+        return [(str(hosts[i]), float(rate[i]), int(host_urls[i])) for i in order if rate[i] > 0]
+
+    def longest_runs(self) -> np.ndarray:
+        """每个链接连续在线的最长快照数"""
+        run = np.zeros(len(self.urls), dtype=np.int32)
+        best = np.zeros(len(self.urls), dtype=np.int32)
+        for _, chunk in self.iter_chunks():
+            for row in chunk:
+                run = (run + 1) * row
+                np.maximum(best, run, out=best)
+        return best
+
+    def longest_lived(self, per_channel: int = 3) -> dict:
+        """每个频道连续在线最久的若干个链接：频道 -> [(链接, 最长连续快照数)]"""
+        best = self.longest_runs()
+        channels, channel_ids = np.unique(self.channels, return_inverse=True)
+        order = np.lexsort((-best, channel_ids))
+        result = {}
+        for i in order:
+            picked = result.setdefault(str(channels[channel_ids[i]]), [])
+            if len(picked) < per_channel:
+                picked.append((self.urls[i], int(best[i])))
+        return result
+
+    def new_since_last_build(self):
+        """最近一次快照中新出现（上一次没有）的 (频道, 链接)"""
+        n = len(self.snapshots)
+        if not n:
+            return []
+        last = self._unpack(max(n - 2, 0), n)
+        fresh = last[-1] & ~last[-2] if n > 1 else last[-1]
+        return [(self.channels[i], self.urls[i]) for i in np.flatnonzero(fresh)]
+
+def load_uptime(root: Path = AVAIL_DIR) -> dict:
+    """读取已有索引的在线率，索引不存在时返回空字典"""
+    if not (Path(root) / META_FILE).exists():
+        return {}
+    return AvailabilityIndex(root).uptime_map()
+
+def build_report(index: AvailabilityIndex) -> str:
+    uptime = index.uptime()
+    lines = [f"可用性报告：{len(index.snapshots)} 个快照，{len(index.urls)} 个链接"]
+    if index.snapshots:
+        lines.append(f"最新快照: {index.snapshots[-1]}")
+        lines.append(f"平均在线率: {uptime.mean():.1%}")
+
+    fresh = index.new_since_last_build()
+    lines.append("")
+    lines.append(f"🆕 本次新增链接（{len(fresh)} 个）")
+    lines += [f"{channel},{url}" for channel, url in fresh]
+
+    lines.append("")
+    lines.append("📉 频繁上下线的主机（平均每链接切换次数）")
+    lines += [f"{host} {rate:.2f} ({count} 个链接)" for host, rate, count in index.flapping_hosts()]
+
+    lines.append("")
+    lines.append("🏆 各频道连续在线最久的链接（连续快照数）")
+    for channel, picked in index.longest_lived().items():
+        lines.append(f"{channel}: " + " | ".join(f"{url} ({run})" for url, run in picked))
+    return "\n".join(lines) + "\n"
+
+def main():
+    index = AvailabilityIndex()
+    added = index.update()
+    print(f"📊 新增 {added} 个快照，共 {len(index.snapshots)} 个快照、{len(index.urls)} 个链接")
+
+    report_path = AVAIL_DIR / REPORT_FILE
+    AVAIL_DIR.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(build_report(index), encoding="utf-8")
+    print(f"✅ 可用性报告已保存至 {report_path}")
+
+if __name__ == "__main__":
+    main()
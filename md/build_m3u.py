@@ -1,8 +1,15 @@
 import os
 import re
+import codecs
 import requests
 from pathlib import Path
 from collections import defaultdict
+from functools import lru_cache
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import http_client
+from shards import WRITE_GROUP_SHARDS, write_group_shards
 
 # 禁用 SSL 警告（忽略过期证书）
 import urllib3
@@ -21,6 +28,13 @@ LINKS_FILE_PATH = Path("md/httop_links.txt")
 SAVE_ORIGINAL_DIR = Path("md")
 SAVE_ORIGINAL_DIR.mkdir(parents=True, exist_ok=True)
 
+# 聚合模式：并发下载全部链接并合并去重（AGGREGATE_ALL_LINKS=1 开启），默认仍为逐个尝试直到成功
+AGGREGATE_ALL_LINKS = os.getenv("AGGREGATE_ALL_LINKS", "0") == "1"
+# 聚合模式下的并发下载数
+AGGREGATE_MAX_WORKERS = 8
+# 流式下载每次读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+
 PROVINCES = [
     "北京","上海","天津","重庆","辽宁","吉林","黑龙江","江苏","浙江","安徽",
     "福建","江西","山东","河南","湖北","湖南","广东","广西","海南","四川",
@@ -68,7 +82,7 @@ def download_m3u_from_links() -> str:
     for idx, url in enumerate(links, 1):
         print(f"[{idx}/{len(links)}] 正在尝试下载: {url}")
         try:
-            r = requests.get(url, timeout=20, verify=False)
+            r = http_client.get(url, timeout=20, verify=False)
             r.raise_for_status()
             content = r.text.strip()
             if content.startswith("#EXTM3U") or "#EXTINF" in content:
@@ -91,33 +105,145 @@ def save_original_m3u(content: str, suffix: str = "latest"):
     save_path.write_text(content, encoding="utf-8")
     print(f"💾 原始文件已保存到 {save_path}")
 
-def parse_m3u(content: str):
-    lines = content.splitlines()
-    result = []
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
+def parse_extinf(info: str):
+    """从 #EXTINF 行提取 (频道名, 分组, 台标)"""
+    tvg_name_match = re.search(r'tvg-name="([^"]*)"', info)
+    group_title_match = re.search(r'group-title="([^"]*)"', info)
+    tvg_logo_match = re.search(r'tvg-logo="([^"]*)"', info)
+
+    name = tvg_name_match.group(1) if tvg_name_match else info.split(",")[-1].strip()
+    grp = group_title_match.group(1) if group_title_match else ""
+    logo = tvg_logo_match.group(1) if tvg_logo_match else ""
+    return name, grp, logo
+
+def iter_m3u(lines):
+    """逐行解析 m3u，边读边产出 (name, url, grp, logo)，可直接接在流式下载后面"""
+    info = None
+    for line in lines:
+        line = line.strip()
+        if info is not None:
+            # #EXTINF 的下一行必须是链接，否则丢弃这条 #EXTINF
+            if line and not line.startswith("#"):
+                name, grp, logo = parse_extinf(info)
+                yield name, line, grp, logo
+                info = None
+                continue
+            info = None
         if line.startswith("#EXTINF"):
             info = line
-            url_line = lines[i + 1].strip() if i + 1 < len(lines) else ""
-            if not url_line or url_line.startswith("#"):
-                i += 1
+
+def parse_m3u(content: str):
+    return list(iter_m3u(content.splitlines()))
+
+def iter_response_lines(r):
+    """按 LF 切分流式响应（增量解码，跨数据块的多字节字符和 CRLF 都不会被拆开）
+
+    不用 requests 的 iter_lines：它对每个数据块单独 splitlines()，
+    CRLF 恰好落在块边界时会多出一个空行，导致紧跟其后的频道被丢弃。
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(r.encoding)(errors="replace")
+    except LookupError:
+        # 服务器声明了未知字符集：与 r.text 一样退回 utf-8，而不是丢弃整个源
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    for chunk in r.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+def stream_m3u_channels(url: str):
+    """流式下载单个 m3u，按数据块到达顺序逐行解析"""
+    with http_client.get(url, timeout=20, verify=False, stream=True) as r:
+        r.raise_for_status()
+        if r.encoding is None or r.encoding.lower() == "iso-8859-1":
+            r.encoding = "utf-8"
+        yield from iter_m3u(iter_response_lines(r))
+
+def download_all_links() -> list:
+    """并发下载 md/httop_links.txt 中的全部链接，边下载边解析、跨源去重，返回合并后的频道列表
+
+    同一链接出现在多个源中时，保留链接文件中排在最前的源（同一源内保留首次出现），
+    与下载完成的先后无关；结果按 (源序号, 源内序号) 排序，保证每次输出一致。
+    每个源先在本地去重缓冲，完整下载后才并入结果，中途失败的源不会留下部分频道。
+    """
+    if not LINKS_FILE_PATH.exists():
+        raise RuntimeError(f"❌ 链接文件不存在: {LINKS_FILE_PATH}")
+
+    links = [line.strip() for line in LINKS_FILE_PATH.read_text(encoding="utf-8").splitlines() if line.strip() and not line.strip().startswith("#")]
+
+    if not links:
+        raise RuntimeError(f"❌ {LINKS_FILE_PATH} 中没有有效的链接")
+
+    print(f"🔗 聚合模式：并发下载 {len(links)} 个链接")
+
+    # 去重表：链接 -> (源序号, 源内序号, 频道)
+    merged = {}
+    lock = Lock()
+
+    def consume(idx, url):
+        # 源内去重：链接 -> (源内序号, 频道)，保留首次出现
+        local = {}
+        count = 0
+        for pos, channel in enumerate(stream_m3u_channels(url)):
+            count += 1
+            local.setdefault(channel[1], (pos, channel))
+
+        # “比较后写入”不是原子操作，需要加锁
+        with lock:
+            for url_key, (pos, channel) in local.items():
+                current = merged.get(url_key)
+                if current is None or (idx, pos) < current[:2]:
+                    merged[url_key] = (idx, pos, channel)
+        return count
+
+    ok = 0
+    with ThreadPoolExecutor(max_workers=AGGREGATE_MAX_WORKERS) as executor:
+        futures = {executor.submit(consume, idx, url): (idx, url) for idx, url in enumerate(links, 1)}
+        for future in as_completed(futures):
+            idx, url = futures[future]
+            try:
+                count = future.result()
+            except Exception as e:
+                print(f"❌ [{idx}/{len(links)}] 下载失败 {url}: {e}")
                 continue
+            if count:
+                ok += 1
+                print(f"✅ [{idx}/{len(links)}] {url} 解析到 {count} 个频道")
+            else:
+                print(f"⚠️ [{idx}/{len(links)}] 下载内容无效（非 m3u 格式）: {url}")
 
-            tvg_name_match = re.search(r'tvg-name="([^"]*)"', info)
-            group_title_match = re.search(r'group-title="([^"]*)"', info)
-            tvg_logo_match = re.search(r'tvg-logo="([^"]*)"', info)
+    if not merged:
+        raise RuntimeError("❌ 所有链接均下载失败或内容无效，请检查 md/httop_links.txt 中的链接")
 
-            name = tvg_name_match.group(1) if tvg_name_match else info.split(",")[-1].strip()
-            grp = group_title_match.group(1) if group_title_match else ""
-            logo = tvg_logo_match.group(1) if tvg_logo_match else ""
+    channels = [channel for _, _, channel in sorted(merged.values(), key=lambda item: item[:2])]
+    print(f"🧩 {ok}/{len(links)} 个源有效，去重后共 {len(channels)} 个频道")
+    return channels
 
-            result.append((name, url_line, grp, logo))
-            i += 2
-        else:
-            i += 1
-    return result
+@lru_cache(maxsize=None)
+def logo_folder_index(tvlogo_dir: Path):
+    """台标目录索引：[(文件夹名, [去掉英文前缀的台标名, ...]), ...]，保持目录遍历顺序"""
+    index = []
+    if tvlogo_dir.exists():
+        for folder in tvlogo_dir.iterdir():
+            if not folder.is_dir() or folder.name in ["央视频道", "卫视频道", "地方频道"]:
+                continue
+            names = []
+            for logo_file in folder.iterdir():
+                if logo_file.is_file():
+                    names.append(re.sub(r'^[A-Za-z0-9\+\-]+', '', logo_file.stem))
+            index.append((folder.name, names))
+    return index
+
+def clear_caches():
+    """台标目录变化后清空缓存（常驻进程使用）"""
+    logo_folder_index.cache_clear()
+    classify_channel.cache_clear()
 
+@lru_cache(maxsize=None)
 def classify_channel(name: str, original_group: str, tvlogo_dir: Path) -> str:
     for key, val in SPECIAL_CHANNELS.items():
         if key in name:
@@ -132,16 +258,10 @@ def classify_channel(name: str, original_group: str, tvlogo_dir: Path) -> str:
         return "卫视频道"
     
     # 台标文件夹匹配逻辑
-    if tvlogo_dir.exists():
-        for folder in tvlogo_dir.iterdir():
-            if not folder.is_dir() or folder.name in ["央视频道", "卫视频道", "地方频道"]:
-                continue
-            for logo_file in folder.iterdir():
-                if logo_file.is_file():
-                    filename = logo_file.stem
-                    ch_name = re.sub(r'^[A-Za-z0-9\+\-]+', '', filename)
-                    if ch_name and ch_name in name:
-                        return folder.name
+    for folder_name, ch_names in logo_folder_index(tvlogo_dir):
+        for ch_name in ch_names:
+            if ch_name and ch_name in name:
+                return folder_name
     return "其他频道"
 
 def generate_tvbox_txt(channels):
@@ -163,6 +283,13 @@ def generate_tvbox_txt(channels):
     else:
         print(f"⚠️ {TVBOX_TXT_FILE} 内容无变化，未覆盖")
 
+    if WRITE_GROUP_SHARDS:
+        shards = {}
+        for group, entries in grouped.items():
+            shard_lines = [f"📺{group},#genre#"] + [f"{name},{url}" for name, url in entries]
+            shards[group] = ("\n".join(shard_lines), len(entries))
+        write_group_shards(shards, "txt")
+
 def generate_output_with_logo(channels):
     out_lines = ["#EXTM3U"]
     missing_logos = []
@@ -189,10 +316,12 @@ def generate_output_with_logo(channels):
 def main():
     try:
         # 1. 从 md/httop_links.txt 读取链接并下载
-        content = download_m3u_from_links()
-        
         # 2. 解析频道
-        channels = parse_m3u(content)
+        if AGGREGATE_ALL_LINKS:
+            channels = download_all_links()
+        else:
+            content = download_m3u_from_links()
+            channels = parse_m3u(content)
         print(f"📡 解析得到 {len(channels)} 个频道")
         
         # 3. 生成 output.m3u（保留原有 logo）
@@ -213,6 +342,7 @@ def main():
         # 4. 生成其他文件
         generate_output_with_logo(channels)
         generate_tvbox_txt(channels)
+        http_client.print_metrics()
         
     except Exception as e:
         print(f"❌ 脚本执行失败: {e}")
@@ -1,11 +1,16 @@
 import re
 from pathlib import Path
+from collections import defaultdict
+from functools import lru_cache
 import os
 
+from shards import WRITE_GROUP_SHARDS, write_group_shards
+
 INPUT_FILE = "output.m3u"
 OUTPUT_FILE = "output_with_logo.m3u"
 MISSING_LOGO_FILE = "missing_logos.txt"
 TVLOGO_DIR = Path("TVlogo_Images")
+M3U_HEADER = '#EXTM3U x-tvg-url="https://raw.githubusercontent.com/qunhui201/iptv-api/refs/heads/master/output/epg/epg.gz"'
 BASE_LOGO_URL = "https://raw.githubusercontent.com/qunhui201/logo/main/TVlogo_Images"
 PROVINCES = [
     "北京", "上海", "天津", "重庆", "辽宁", "吉林", "黑龙江", "江苏", "浙江", "安徽",
@@ -18,13 +23,30 @@ def normalize_name(name: str):
     """清理频道名，去掉 BTV、频道、高清"""
     return name.replace("BTV", "").replace("频道", "").replace("高清", "").strip()
 
+@lru_cache(maxsize=None)
+def logo_folders():
+    """TVlogo_Images 下的子文件夹（保持目录遍历顺序）"""
+    return [folder for folder in TVLOGO_DIR.iterdir() if folder.is_dir()]
+
+@lru_cache(maxsize=None)
+def logo_files(folder: Path):
+    """文件夹中的台标文件：[(文件名不含扩展名, 文件名), ...]"""
+    return [(file.stem, file.name) for file in folder.iterdir() if file.is_file()]
+
+def clear_caches():
+    """台标目录变化后清空缓存（常驻进程使用）"""
+    logo_folders.cache_clear()
+    logo_files.cache_clear()
+    match_logo.cache_clear()
+
 def find_fuzzy_folder(name):
     """模糊匹配省份文件夹"""
-    for folder in TVLOGO_DIR.iterdir():
-        if folder.is_dir() and name in folder.name:
+    for folder in logo_folders():
+        if name in folder.name:
             return folder
     return None
 
+@lru_cache(maxsize=None)
 def match_logo(channel_name, group_title):
     """匹配台标，支持模糊匹配"""
     logo_path = ""
@@ -46,32 +68,25 @@ def match_logo(channel_name, group_title):
     
     # 文件夹存在则尝试模糊匹配
     if folder and folder.is_dir():
-        for file in folder.iterdir():
-            if not file.is_file():
-                continue
-            filename = file.stem
+        for filename, file_name in logo_files(folder):
             if clean_name in filename or filename in clean_name:
-                logo_path = f"{BASE_LOGO_URL}/{folder.name}/{file.name}"
+                logo_path = f"{BASE_LOGO_URL}/{folder.name}/{file_name}"
                 return logo_path
 
     # 其他频道全局模糊匹配
     if not logo_path:
-        for folder in TVLOGO_DIR.iterdir():
-            if not folder.is_dir():
-                continue
-            for file in folder.iterdir():
-                if not file.is_file():
-                    continue
-                filename = file.stem
+        for folder in logo_folders():
+            for filename, file_name in logo_files(folder):
                 if clean_name in filename or filename in clean_name:
-                    logo_path = f"{BASE_LOGO_URL}/{folder.name}/{file.name}"
+                    logo_path = f"{BASE_LOGO_URL}/{folder.name}/{file_name}"
                     return logo_path
 
     return logo_path
 
 def main():
-    output_lines = ['#EXTM3U x-tvg-url="https://raw.githubusercontent.com/qunhui201/iptv-api/refs/heads/master/output/epg/epg.gz"']
+    output_lines = [M3U_HEADER]
     missing_logos = []
+    grouped = defaultdict(list)
 
     with open(INPUT_FILE, "r", encoding="utf-8") as f:
         lines = f.read().splitlines()
@@ -89,8 +104,10 @@ def main():
             logo = match_logo(name, group)
             if not logo:
                 missing_logos.append(f"{group} - {name}")
-            output_lines.append(f'#EXTINF:-1 tvg-name="{name}" tvg-logo="{logo}" group-title="{group}",{name}')
+            extinf = f'#EXTINF:-1 tvg-name="{name}" tvg-logo="{logo}" group-title="{group}",{name}'
+            output_lines.append(extinf)
             output_lines.append(url)
+            grouped[group].append((extinf, url))
             i += 2
         else:
             i += 1
@@ -103,6 +120,17 @@ def main():
     with open(MISSING_LOGO_FILE, "w", encoding="utf-8") as f:
         f.write("\n".join(missing_logos))
 
+    # 按分组拆分输出（与合并文件相同的头部和末尾换行）
+    if WRITE_GROUP_SHARDS:
+        shards = {}
+        for group, entries in grouped.items():
+            shard_lines = [M3U_HEADER]
+            for extinf, url in entries:
+                shard_lines.append(extinf)
+                shard_lines.append(url)
+            shards[group] = ("\n".join(shard_lines) + "\n", len(entries))
+        write_group_shards(shards, "m3u")
+
     print(f"✅ 已生成 {OUTPUT_FILE}")
     print(f"📺 共 {sum(1 for l in output_lines if l.startswith('#EXTINF'))} 个频道")
     print(f"⚠️ 未匹配台标的频道已保存至 {MISSING_LOGO_FILE}（共 {len(missing_logos)} 个）")
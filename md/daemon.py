@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""常驻进程：替代 cron 冷启动，在一个进程内定时执行 抓取 / 构建 / 合并 / 去重 / 上传
+
+台标索引、频道分类缓存、可用性索引和 HTTP 连接池都保留在内存中；
+md/httop_links.txt 或 TVlogo_Images 变化时才触发重新构建。
+在仓库根目录运行：python3 md/daemon.py
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import hashlib
+import threading
+from datetime import datetime
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# upload_to_kv.py 位于仓库根目录
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import history
+import http_client
+import upload_to_kv
+import httop_crawler
+import build_m3u
+import build_m3u_add_logo
+import merge_tvlist
+from availability import AvailabilityIndex, AVAIL_DIR, REPORT_FILE, build_report
+
+# ========== 配置 ==========
+HEALTH_HOST = "127.0.0.1"
+HEALTH_PORT = int(os.getenv("DAEMON_PORT", "8377"))
+WATCH_INTERVAL = 30           # 检查输入文件变化的间隔（秒）
+CRAWL_INTERVAL = 3600         # 抓取 httop 链接，对应原 "0 * * * *"
+BUILD_INTERVAL = 6 * 3600     # 即使输入未变化也定时重建（上游 m3u 内容会变），对应原 "30 */6 * * *"
+DEDUPE_INTERVAL = 6 * 3600    # 本地 history 去重，对应原 "40 */6 * * *"
+
+HISTORY_DIR = Path("history")
+LINKS_FILE = build_m3u.LINKS_FILE_PATH
+TVLOGO_DIR = build_m3u.TVLOGO_DIR
+
+def links_fingerprint():
+    """链接文件内容的哈希（抓取结果相同时不会触发重建）"""
+    if not LINKS_FILE.exists():
+        return None
+    return hashlib.sha256(LINKS_FILE.read_bytes()).hexdigest()
+
+def tvlogo_fingerprint():
+    """台标目录及各子目录的修改时间（增删改名都会改变目录 mtime）"""
+    if not TVLOGO_DIR.exists():
+        return None
+    entries = [(".", TVLOGO_DIR.stat().st_mtime_ns)]
+    for entry in os.scandir(TVLOGO_DIR):
+        if entry.is_dir():
+            entries.append((entry.name, entry.stat().st_mtime_ns))
+    return tuple(sorted(entries))
+
+class Job:
+    """定时任务：记录最近一次运行结果和耗时，供 /health 和 /metrics 查询"""
+
+    def __init__(self, name, func, interval=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.next_run = time.time() if interval else None
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None
+        self.last_ok = None
+        self.last_error = None
+        self.last_duration = None
+
+    def due(self, now):
+        return self.next_run is not None and now >= self.next_run
+
+    def run(self):
+        start = time.time()
+        print(f"⏰ [{datetime.now():%Y-%m-%d %H:%M:%S}] 开始任务: {self.name}")
+        try:
+            self.func()
+            self.last_ok = start
+            self.last_error = None
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"❌ 任务失败 {self.name}: {e}")
+        self.runs += 1
+        self.last_run = start
+        self.last_duration = time.time() - start
+        if self.interval:
+            self.next_run = start + self.interval
+
+    def status(self):
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "last_ok": self.last_ok,
+            "last_error": self.last_error,
+            "last_duration": self.last_duration,
+            "next_run": self.next_run,
+        }
+
+class PipelineDaemon:
+    def __init__(self):
+        self.started = time.time()
+        self.stop_event = threading.Event()
+        self.availability = AvailabilityIndex()
+        self.links_fp = links_fingerprint()
+        self.tvlogo_fp = tvlogo_fingerprint()
+        self.watch_errors = 0
+        self.last_watch_error = None
+
+        self.jobs = {
+            "crawl": Job("crawl", self.crawl, CRAWL_INTERVAL),
+            "build": Job("build", self.build, BUILD_INTERVAL),
+            "dedupe": Job("dedupe", self.dedupe, DEDUPE_INTERVAL),
+        }
+
+    # ---------- 任务 ----------
+    def crawl(self):
+        if httop_crawler.crawl() is None:
+            raise RuntimeError("抓取 httop 链接失败")
+
+    def build(self):
+        """构建 + 保存快照 + 可用性索引 + 合并 + 上传，对应 build_m3u.yml 的各个步骤"""
+        build_m3u.main()
+        build_m3u_add_logo.main()
+
+        timestamp = datetime.now().strftime("%m%d%H%M")
+        HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(build_m3u_add_logo.OUTPUT_FILE, HISTORY_DIR / f"logo{timestamp}.m3u")
+        shutil.copyfile(build_m3u.TVBOX_TXT_FILE, HISTORY_DIR / f"tvbox_{timestamp}.txt")
+
+        added = self.availability.update(HISTORY_DIR)
+        AVAIL_DIR.mkdir(parents=True, exist_ok=True)
+        (AVAIL_DIR / REPORT_FILE).write_text(build_report(self.availability), encoding="utf-8")
+        print(f"📊 可用性索引新增 {added} 个快照")
+
+        merge_tvlist.main()
+
+        if all(os.getenv(k) for k in ("KV_ACCOUNT_ID", "KV_NAMESPACE_ID", "KV_API_TOKEN")):
+            upload_to_kv.upload_build_outputs(timestamp)
+        else:
+            print("⏭ 未配置 KV_ACCOUNT_ID / KV_NAMESPACE_ID / KV_API_TOKEN，跳过上传")
+
+    def dedupe(self):
+        """快照只写在本地 history/，直接对本地目录去重（cron 版本通过 GitHub API 删除已推送的文件）"""
+        history.check_local_duplicates(HISTORY_DIR)
+
+    # ---------- 输入监视 ----------
+    def check_inputs(self):
+        """输入变化时清空台标缓存并立即安排重建；出错（如遍历目录时目录被删除）只记录，下个周期再查"""
+        try:
+            tvlogo_fp = tvlogo_fingerprint()
+            links_fp = links_fingerprint()
+        except Exception as e:
+            self.watch_errors += 1
+            self.last_watch_error = str(e)
+            print(f"❌ 检查输入失败: {e}")
+            return
+        changed = []
+        if tvlogo_fp != self.tvlogo_fp:
+            self.tvlogo_fp = tvlogo_fp
+            changed.append(str(TVLOGO_DIR))
+        if links_fp != self.links_fp:
+            self.links_fp = links_fp
+            changed.append(str(LINKS_FILE))
+        if changed:
+            # 链接变化也清空：新的频道名不断进入分类/台标缓存，常驻进程中会无限增长
+            build_m3u.clear_caches()
+            build_m3u_add_logo.clear_caches()
+            print(f"👀 检测到输入变化: {', '.join(changed)}，安排重新构建")
+            self.jobs["build"].next_run = time.time()
+
+    # ---------- 主循环 ----------
+    def run(self):
+        server = ThreadingHTTPServer((HEALTH_HOST, HEALTH_PORT), make_handler(self))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"🚀 常驻进程已启动，健康检查: http://{HEALTH_HOST}:{HEALTH_PORT}/health")
+
+        next_watch = 0
+        try:
+            while not self.stop_event.is_set():
+                now = time.time()
+                if now >= next_watch:
+                    self.check_inputs()
+                    next_watch = now + WATCH_INTERVAL
+                for job in self.jobs.values():
+                    if job.due(time.time()):
+                        job.run()
+                        # 抓取可能更新了链接文件，马上检查，避免多等一个监视周期
+                        self.check_inputs()
+                self.stop_event.wait(1)
+        finally:
+            server.shutdown()
+            print("👋 常驻进程已退出")
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+    def health(self):
+        return {
+            "status": "ok",
+            "uptime": time.time() - self.started,
+            "watch_errors": self.watch_errors,
+            "last_watch_error": self.last_watch_error,
+            "jobs": {name: job.status() for name, job in self.jobs.items()},
+        }
+
+    def metrics(self):
+        return {
+            "jobs": {name: job.status() for name, job in self.jobs.items()},
+            "http": http_client.metrics(),
+            "cache": {
+                "classify_channel": build_m3u.classify_channel.cache_info()._asdict(),
+                "match_logo": build_m3u_add_logo.match_logo.cache_info()._asdict(),
+                "availability_snapshots": len(self.availability.snapshots),
+                "availability_urls": len(self.availability.urls),
+            },
+        }
+
+def make_handler(daemon):
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/health":
+                body = daemon.health()
+            elif self.path == "/metrics":
+                body = daemon.metrics()
+            else:
+                self.send_error(404)
+                return
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return HealthHandler
+
+def main():
+    daemon = PipelineDaemon()
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 import os
 import re
-import requests
 from pathlib import Path
 
+import http_client
+
 # GitHub 原始内容 URL 模板（不要在这里再加 .md）
 MD_BASE_URL = "https://raw.githubusercontent.com/qunhui201/TVlogo/main/md/{}"
 
@@ -20,19 +21,17 @@ MAX_RETRIES = 3
 failed_downloads = []
 
 def download_image(url, save_path):
-    """下载图片，失败重试"""
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            resp = requests.get(url, timeout=10)
-            if resp.status_code == 200:
-                with open(save_path, "wb") as f:
-                    f.write(resp.content)
-                print(f"下载成功: {save_path}")
-                return True
-            else:
-                print(f"请求状态码 {resp.status_code}，重试 {attempt}/{MAX_RETRIES}")
-        except Exception as e:
-            print(f"请求异常 {e}，重试 {attempt}/{MAX_RETRIES}")
+    """下载图片，失败重试（退避与熔断由 http_client 处理）"""
+    try:
+        resp = http_client.get(url, timeout=10, retries=MAX_RETRIES - 1)
+        if resp.status_code == 200:
+            with open(save_path, "wb") as f:
+                f.write(resp.content)
+            print(f"下载成功: {save_path}")
+            return True
+        print(f"请求状态码 {resp.status_code}")
+    except Exception as e:
+        print(f"请求异常 {e}")
     print(f"下载失败: {save_path}")
     failed_downloads.append(str(save_path))
     return False
@@ -40,7 +39,7 @@ def download_image(url, save_path):
 def process_md(md_url):
     """处理单个 md 文件"""
     try:
-        resp = requests.get(md_url)
+        resp = http_client.get(md_url)
         if resp.status_code != 200:
             print(f"下载 md 文件失败: {md_url}")
             return
@@ -73,6 +72,7 @@ def main():
         process_md(md_url)
 
     print("\n全部下载完成")
+    http_client.print_metrics()
     if failed_downloads:
         print("以下文件下载失败：")
         for f in failed_downloads:
@@ -5,6 +5,9 @@ import json
 import os
 import re
 from datetime import datetime
+from pathlib import Path
+
+import http_client
 
 # ========== 配置 ==========
 REPO_OWNER = "qunhui201"
@@ -21,15 +24,13 @@ HEADERS = {
 }
 if GITHUB_TOKEN:
     HEADERS['Authorization'] = f'token {GITHUB_TOKEN}'
-else:
-    raise ValueError("❌ TVlogo_TOKEN 环境变量未设置，无法删除文件")
 
 def get_github_contents(repo_owner, repo_name, path, branch='main', recursive=False):
     """递归获取 GitHub 目录/文件内容"""
     api_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{path}?ref={branch}"
     files = []
     try:
-        response = requests.get(api_url, headers=HEADERS)
+        response = http_client.get(api_url, headers=HEADERS)
         response.raise_for_status()
         items = response.json()
         
@@ -48,7 +49,7 @@ def get_file_content(item):
     """获取文件内容并计算 MD5 哈希"""
     try:
         content_url = item['download_url']
-        response = requests.get(content_url, headers=HEADERS)
+        response = http_client.get(content_url, headers=HEADERS)
         response.raise_for_status()
         content = response.content
         md5_hash = hashlib.md5(content).hexdigest()
@@ -67,7 +68,8 @@ def delete_file(file_path, sha):
         'branch': BRANCH
     }
     try:
-        response = requests.delete(api_url, headers=HEADERS, json=data)
+        # DELETE 不是幂等的：成功的删除如果丢了响应，重试只会得到 404/409，因此不重试
+        response = http_client.delete(api_url, headers=HEADERS, json=data, retries=0)
         response.raise_for_status()
         print(f"🗑️ 删除重复文件: {file_path}")
         return True
@@ -75,8 +77,73 @@ def delete_file(file_path, sha):
         print(f"❌ 删除失败 {file_path}: {e}")
         return False
 
+def write_report(source, total, duplicates, count, deleted_count):
+    """写入重复文件报告，duplicates 为 哈希 -> 按时间戳从新到旧排列的文件列表"""
+    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        f.write(f"重复文件检查报告 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"{source}\n")
+        f.write(f"总文件数: {total}\n")
+        f.write(f"重复文件数: {count}\n")
+        f.write(f"删除文件数: {deleted_count}\n\n")
+        
+        if duplicates:
+            for md5_hash, file_list in duplicates.items():
+                f.write(f"哈希: {md5_hash}\n")
+                f.write(f"重复文件数: {len(file_list)}\n")
+                f.write(f"保留文件: {file_list[0]['path']} (时间戳: {file_list[0]['timestamp']})\n")
+                for file_info in file_list[1:]:
+                    f.write(f"- 删除: {file_info['path']} (时间戳: {file_info['timestamp']})\n")
+                    f.write(f"  名称: {file_info['name']} (大小: {file_info['size']} bytes)\n")
+                    f.write(f"  预览: {file_info['preview']}\n")
+                f.write("---\n\n")
+            print(f"✅ 发现 {count} 个重复文件，删除 {deleted_count} 个，详情保存到 {OUTPUT_FILE}")
+        else:
+            f.write("🎉 未发现重复文件\n")
+            print("🎉 未发现重复文件")
+
+def check_local_duplicates(directory=Path(DIRECTORY)):
+    """检查并删除本地 history 目录中的重复文件，保留时间戳最新的文件
+
+    供常驻进程（md/daemon.py）使用：快照只写在本地，不需要 GitHub API 和 TVlogo_TOKEN。
+    """
+    directory = Path(directory)
+    print(f"🔍 开始检查本地 {directory} 中的 logo*.m3u 和 tvbox_*.txt 重复文件...")
+    files = sorted(f for f in directory.rglob('*') if f.is_file() and re.match(FILE_PATTERN, f.name))
+
+    hash_map = {}
+    for path in files:
+        content = path.read_bytes()
+        md5_hash = hashlib.md5(content).hexdigest()
+        text = content.decode('utf-8', errors='ignore')
+        hash_map.setdefault(md5_hash, []).append({
+            'path': path.as_posix(),
+            'name': path.name,
+            'size': len(content),
+            'preview': text[:200] + '...' if len(content) > 200 else text,
+            'timestamp': re.search(r'\d{8}', path.name).group(0)
+        })
+
+    duplicates = {h: paths for h, paths in hash_map.items() if len(paths) > 1}
+    count = sum(len(paths) - 1 for paths in duplicates.values())
+    deleted_count = 0
+    for file_list in duplicates.values():
+        # 按时间戳排序，保留最新的
+        file_list.sort(key=lambda x: x['timestamp'], reverse=True)
+        for file_info in file_list[1:]:
+            try:
+                os.remove(file_info['path'])
+                print(f"🗑️ 删除重复文件: {file_info['path']}")
+                deleted_count += 1
+            except OSError as e:
+                print(f"❌ 删除失败 {file_info['path']}: {e}")
+
+    write_report(f"目录: {directory.as_posix()}", len(files), duplicates, count, deleted_count)
+    return deleted_count
+
 def check_duplicates():
     """检查并删除重复文件，保留时间戳最新的文件"""
+    if not GITHUB_TOKEN:
+        raise ValueError("❌ TVlogo_TOKEN 环境变量未设置，无法删除文件")
     print(f"🔍 开始检查 {REPO_OWNER}/{REPO_NAME}/{DIRECTORY} 中的 logo*.m3u 和 tvbox_*.txt 重复文件...")
     start_time = datetime.now()
     
@@ -126,28 +193,9 @@ def check_duplicates():
                 deleted_count += 1
     
     # 输出结果
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(f"重复文件检查报告 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"仓库: {REPO_OWNER}/{REPO_NAME}/{DIRECTORY}\n")
-        f.write(f"总文件数: {len(files)}\n")
-        f.write(f"重复文件数: {count}\n")
-        f.write(f"删除文件数: {deleted_count}\n\n")
-        
-        if duplicates:
-            for md5_hash, file_list in duplicates.items():
-                f.write(f"哈希: {md5_hash}\n")
-                f.write(f"重复文件数: {len(file_list)}\n")
-                f.write(f"保留文件: {file_list[0]['path']} (时间戳: {file_list[0]['timestamp']})\n")
-                for file_info in file_list[1:]:
-                    f.write(f"- 删除: {file_info['path']} (时间戳: {file_info['timestamp']})\n")
-                    f.write(f"  名称: {file_info['name']} (大小: {file_info['size']} bytes)\n")
-                    f.write(f"  预览: {file_info['preview']}\n")
-                f.write("---\n\n")
-            print(f"✅ 发现 {count} 个重复文件，删除 {deleted_count} 个，详情保存到 {OUTPUT_FILE}")
-        else:
-            f.write("🎉 未发现重复文件\n")
-            print("🎉 未发现重复文件")
+    write_report(f"仓库: {REPO_OWNER}/{REPO_NAME}/{DIRECTORY}", len(files), duplicates, count, deleted_count)
     
+    http_client.print_metrics()
     end_time = datetime.now()
     print(f"⏱️ 完成，用时: {end_time - start_time}")
 
@@ -0,0 +1,209 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ========== 配置 ==========
+DEFAULT_TIMEOUT = 20       # 单次请求超时（秒）
+MAX_RETRIES = 3            # 失败后最多重试次数
+BACKOFF_BASE = 0.5         # 指数退避基数（秒）：第 n 次重试最多等待 BACKOFF_BASE * 2^n
+BACKOFF_MAX = 30           # 单次等待上限（秒），同时限制 Retry-After
+HOST_CONCURRENCY = 4       # 每个主机同时进行的请求数
+POOL_SIZE = 16             # 每个主机保持的连接数
+BREAKER_THRESHOLD = 5      # 连续失败多少次后熔断该主机
+BREAKER_COOLDOWN = 60      # 熔断持续时间（秒），之后放行一个探测请求
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """主机处于熔断状态，请求未发出"""
+
+class HostState:
+    """单个主机的并发限制、熔断状态和耗时统计"""
+
+    def __init__(self):
+        self.slots = threading.BoundedSemaphore(HOST_CONCURRENCY)
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_status = None
+
+    def allow(self) -> bool:
+        """熔断关闭时放行；冷却结束后只放行一个探测请求（半开）"""
+        with self.lock:
+            if self.failures < BREAKER_THRESHOLD:
+                return True
+            if time.monotonic() < self.open_until or self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def record(self, elapsed, ok: bool, status=None):
+        """记录一次请求结果并结束半开探测；elapsed 为 None 时耗时稍后由 record_time 补记"""
+        with self.lock:
+            self.requests += 1
+            if elapsed is not None:
+                self.total_time += elapsed
+                self.max_time = max(self.max_time, elapsed)
+            self.last_status = status
+            self.probing = False
+            if ok:
+                self.failures = 0
+                return
+            self.errors += 1
+            self.failures += 1
+            if self.failures >= BREAKER_THRESHOLD:
+                self.open_until = time.monotonic() + BREAKER_COOLDOWN
+
+    def record_time(self, elapsed: float):
+        with self.lock:
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+def host_state(url: str) -> HostState:
+    host = urlsplit(url).netloc
+    with _hosts_lock:
+        state = _hosts.get(host)
+        if state is None:
+            state = _hosts[host] = HostState()
+        return state
+
+def retry_after_seconds(response):
+    """解析 Retry-After（秒数或 HTTP 日期），无法解析时返回 None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, response=None) -> float:
+    """第 attempt 次重试前的等待时间：优先 Retry-After，否则指数退避 + 全抖动"""
+    if response is not None:
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return min(retry_after, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def hold_slot_until_close(response, state: HostState, start: float):
+    """流式响应：连接槽位保持到响应关闭为止，耗时也计到响应体读完/关闭时"""
+    original_close = response.close
+    released = False
+
+    def close():
+        nonlocal released
+        try:
+            original_close()
+        finally:
+            if not released:
+                released = True
+                state.record_time(time.monotonic() - start)
+                state.slots.release()
+
+    response.close = close
+
+def request(method: str, url: str, retries: int = MAX_RETRIES, timeout=DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    """发送请求：复用连接池，按主机限流，失败按指数退避重试，连续失败的主机会被熔断
+
+    连接错误和超时在重试用尽后抛出；429/5xx 在重试用尽后返回最后一次响应，
+    由调用方自行 raise_for_status()。熔断中的主机直接抛出 CircuitOpenError。
+    stream=True 时主机槽位一直占用到响应关闭，调用方必须关闭响应（推荐 with 语句）。
+    """
+    state = host_state(url)
+    stream = kwargs.get("stream", False)
+    attempt = 0
+    while True:
+        if not state.allow():
+            raise CircuitOpenError(f"主机已熔断，暂停请求: {urlsplit(url).netloc}")
+
+        response = None
+        error = None
+        ok = False
+        start = time.monotonic()
+        state.slots.acquire()
+        try:
+            response = _session.request(method, url, timeout=timeout, **kwargs)
+            ok = response.status_code not in RETRY_STATUS
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        finally:
+            # 其他异常（TooManyRedirects、InvalidURL 等）同样记为失败，保证半开探测一定会结束
+            hold = stream and response is not None and (ok or attempt >= retries)
+            state.record(None if hold else time.monotonic() - start, ok,
+                         None if response is None else response.status_code)
+            if not hold:
+                state.slots.release()
+
+        if hold:
+            hold_slot_until_close(response, state, start)
+
+        if ok or attempt >= retries:
+            if error is not None:
+                raise error
+            return response
+
+        delay = backoff_delay(attempt, response)
+        if response is not None:
+            response.close()
+        attempt += 1
+        with state.lock:
+            state.retries += 1
+        time.sleep(delay)
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+def head(url: str, **kwargs) -> requests.Response:
+    return request("HEAD", url, **kwargs)
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request("PUT", url, **kwargs)
+
+def delete(url: str, **kwargs) -> requests.Response:
+    return request("DELETE", url, **kwargs)
+
+def metrics() -> dict:
+    """按主机汇总的请求统计"""
+    with _hosts_lock:
+        items = list(_hosts.items())
+    result = {}
+    for host, state in items:
+        with state.lock:
+            result[host] = {
+                "requests": state.requests,
+                "errors": state.errors,
+                "retries": state.retries,
+                "avg_time": state.total_time / state.requests if state.requests else 0.0,
+                "max_time": state.max_time,
+                "last_status": state.last_status,
+                "circuit_open": state.failures >= BREAKER_THRESHOLD,
+            }
+    return result
+
+def print_metrics():
+    for host, m in metrics().items():
+        flag = " ⛔熔断" if m["circuit_open"] else ""
+        print(f"🌐 {host}: {m['requests']} 次请求, {m['errors']} 次失败, {m['retries']} 次重试, "
+              f"平均 {m['avg_time']:.2f}s, 最长 {m['max_time']:.2f}s{flag}")
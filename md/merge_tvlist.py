@@ -1,6 +1,11 @@
+import io
+import os
 import re
+import hashlib
+import tempfile
 from pathlib import Path
-from collections import defaultdict
+
+import numpy as np
 
 folder = Path("history")
 output_m3u = folder / "merged.m3u"
@@ -9,6 +14,14 @@ output_txt = folder / "merged.txt"
 # M3U 文件头
 tvg_header = '#EXTM3U x-tvg-url="http://httop.top/e.xml"\n'
 
+# 按历史在线率排序（RANK_BY_UPTIME=1 开启，需先运行 md/availability.py 生成索引）
+# 开启后同一分组内在线率高的链接排在前面；默认关闭，保持原有顺序
+RANK_BY_UPTIME = os.getenv("RANK_BY_UPTIME", "0") == "1"
+
+# 去重集合落盘目录（MERGE_SPILL_DIR）：设置后摘要表和分组临时文件都放在该目录，
+# 摘要表以 memmap 方式存放，进一步降低常驻内存；默认使用系统临时目录、摘要表在内存中
+SPILL_DIR = os.getenv("MERGE_SPILL_DIR") or None
+
 # 解析 M3U 结构
 pattern_m3u = re.compile(r'(#EXTINF[^\n]*\n)(http[^\n]+)', re.MULTILINE)
 
@@ -32,73 +45,207 @@ def extract_txt(file_path):
             entries.append((current_group, name.strip(), url.strip()))
     return entries
 
-def merge_m3u():
-    all_entries = []
-    for f in folder.glob("*.m3u"):
-        if f.name.startswith("merged."):
-            continue
-        all_entries.extend(extract_m3u(f))
-
-    seen = set()
-    unique = []
-    for extinf, url in all_entries:
-        if url not in seen:
-            seen.add(url)
-            unique.append((extinf.strip(), url.strip()))
-
-    # 分类
-    cctv, weishi, others = [], [], []
-    for extinf, url in unique:
-        if "央视频道" in extinf:
-            cctv.append((extinf, url))
-        elif "卫视频道" in extinf:
-            weishi.append((extinf, url))
+def iter_history(pattern, parser):
+    """逐个解析 history 中的文件（跳过 merged.*），每次产出一个文件的全部条目
+
+    解析结果不做缓存：同一时刻内存中只保留一个文件的条目。
+    """
+    for f in folder.glob(pattern):
+        if not f.name.startswith("merged."):
+            yield parser(f)
+
+def load_ranking():
+    """返回 链接 -> 在线率；未开启排序时返回 None"""
+    if not RANK_BY_UPTIME:
+        return None
+    from availability import load_uptime
+    return load_uptime()
+
+class DigestSet:
+    """只保存 64 位摘要的去重集合：numpy uint64 开放寻址表，每个唯一键占 8~16 字节
+
+    与保存完整字符串的 set 相比内存小一个数量级；两个不同键摘要相同的概率约为
+    n²/2⁶⁵（10 万个唯一键时约 3×10⁻¹⁰），可以忽略。
+    spill_dir 不为空时表存放在该目录下的 memmap 文件中。
+    """
+
+    def __init__(self, capacity: int = 1 << 16, spill_dir=None):
+        self.spill_dir = spill_dir
+        self.size = 0
+        self._file = None
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        old_file = self._file
+        if self.spill_dir is None:
+            self.table = np.zeros(capacity, dtype=np.uint64)
+            self._file = None
         else:
-            others.append((extinf, url))
+            fd, self._file = tempfile.mkstemp(suffix=".digests", dir=self.spill_dir)
+            os.close(fd)
+            self.table = np.memmap(self._file, dtype=np.uint64, mode="w+", shape=(capacity,))
+        self.mask = capacity - 1
+        return old_file
+
+    def _insert(self, digest: int) -> bool:
+        table, mask = self.table, self.mask
+        i = digest & mask
+        while True:
+            slot = int(table[i])
+            if slot == 0:
+                table[i] = digest
+                return True
+            if slot == digest:
+                return False
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old = self.table[self.table != 0]
+        old_file = self._alloc(len(self.table) * 2)
+        for digest in old.tolist():
+            self._insert(digest)
+        if old_file:
+            os.remove(old_file)
+
+    def add(self, key: str) -> bool:
+        """加入 key，首次出现返回 True"""
+        digest = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+        if not self._insert(digest):
+            return False
+        self.size += 1
+        if self.size * 2 > len(self.table):
+            self._grow()
+        return True
+
+    def close(self):
+        self.table = None
+        if self._file:
+            os.remove(self._file)
+            self._file = None
+
+class GroupSpool:
+    """按分组追加写入临时文件，最后按需要的分组顺序逐行读回，不在内存中保留条目"""
+
+    def __init__(self, tmp_dir: str):
+        self.tmp_dir = tmp_dir
+        self.files = {}
+
+    def append(self, group: str, *lines: str):
+        f = self.files.get(group)
+        if f is None:
+            path = os.path.join(self.tmp_dir, f"group{len(self.files)}.tmp")
+            f = self.files[group] = open(path, "w+", encoding="utf-8", newline="\n")
+        for line in lines:
+            f.write(line)
+            f.write("\n")
+
+    def read(self, group: str):
+        f = self.files[group]
+        f.flush()
+        f.seek(0)
+        for line in f:
+            yield line[:-1]
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+def prepare_spill_dir():
+    """返回落盘目录；设置了 MERGE_SPILL_DIR 但目录不存在时先创建"""
+    if SPILL_DIR:
+        os.makedirs(SPILL_DIR, exist_ok=True)
+    return SPILL_DIR
+
+def ranked(records, uptime, url_of):
+    """按在线率重排一个分组内的记录（稳定排序）；未开启排序时原样流式返回"""
+    if uptime is None:
+        return records
+    return sorted(records, key=lambda r: -uptime.get(url_of(r), 0.0))
+
+def write_merged_m3u(out):
+    """流式合并 history/*.m3u 写入 out：按链接去重，央视、卫视、其他依次输出"""
+    uptime = load_ranking()
+    spill_dir = prepare_spill_dir()
+    seen = DigestSet(spill_dir=spill_dir)
+    categories = ["央视频道", "卫视频道", "其他"]
+    with tempfile.TemporaryDirectory(dir=spill_dir) as tmp_dir:
+        spool = GroupSpool(tmp_dir)
+        try:
+            for entries in iter_history("*.m3u", extract_m3u):
+                for extinf, url in entries:
+                    if not seen.add(url):
+                        continue
+                    extinf = extinf.strip()
+                    if "央视频道" in extinf:
+                        category = "央视频道"
+                    elif "卫视频道" in extinf:
+                        category = "卫视频道"
+                    else:
+                        category = "其他"
+                    spool.append(category, extinf, url.strip())
+
+            # 与 "\n".join([tvg_header, extinf, url, ...]) + "\n" 逐字节一致
+            out.write(tvg_header)
+            for category in categories:
+                if category not in spool.files:
+                    continue
+                lines = spool.read(category)
+                pairs = ranked(zip(lines, lines), uptime, lambda r: r[1])
+                for extinf, url in pairs:
+                    out.write("\n" + extinf + "\n" + url)
+            out.write("\n")
+        finally:
+            spool.close()
+            seen.close()
+
+def write_merged_txt(out):
+    """流式合并 history/*.txt 写入 out：按 频道名 + 链接 去重，央视、卫视在前，其余分组按名称排序"""
+    uptime = load_ranking()
+    spill_dir = prepare_spill_dir()
+    seen = DigestSet(spill_dir=spill_dir)
+    with tempfile.TemporaryDirectory(dir=spill_dir) as tmp_dir:
+        spool = GroupSpool(tmp_dir)
+        try:
+            for entries in iter_history("*.txt", extract_txt):
+                for group, name, url in entries:
+                    # 长度前缀保证 (name, url) 拼接后不会产生歧义
+                    if seen.add(f"{len(name)}:{name}{url}"):
+                        spool.append(group, f"{name},{url}")
+
+            # 分类排序
+            groups = [title for title in ["央视频道", "卫视频道"] if title in spool.files]
+            groups += sorted(g for g in spool.files if g not in ("央视频道", "卫视频道"))  # 其他分类按字母排序放最后
+
+            # 输出格式：与 "\n".join(lines) + "\n" 逐字节一致
+            first = True
+            for group in groups:
+                out.write(f"📺{group},#genre#" if first else f"\n📺{group},#genre#")
+                first = False
+                for line in ranked(spool.read(group), uptime, lambda r: r.split(",", 1)[1]):
+                    out.write("\n" + line)
+            out.write("\n")
+        finally:
+            spool.close()
+            seen.close()
 
-    lines = [tvg_header]
-    for extinf, url in cctv + weishi + others:
-        lines.append(extinf)
-        lines.append(url)
-    return "\n".join(lines) + "\n"
+def merge_m3u():
+    buf = io.StringIO()
+    write_merged_m3u(buf)
+    return buf.getvalue()
 
 def merge_txt():
-    all_entries = []
-    for f in folder.glob("*.txt"):
-        if f.name.startswith("merged."):
-            continue
-        all_entries.extend(extract_txt(f))
-
-    # 去重：按 频道名 + 链接
-    seen = set()
-    grouped = defaultdict(list)
-    for group, name, url in all_entries:
-        key = (name, url)
-        if key not in seen:
-            seen.add(key)
-            grouped[group].append((name, url))
-
-    # 分类排序
-    ordered_groups = []
-    for title in ["央视频道", "卫视频道"]:
-        if title in grouped:
-            ordered_groups.append((title, grouped.pop(title)))
-    ordered_groups += sorted(grouped.items())  # 其他分类按字母排序放最后
-
-    # 输出格式
-    lines = []
-    for group, channels in ordered_groups:
-        lines.append(f"📺{group},#genre#")
-        for name, url in channels:
-            lines.append(f"{name},{url}")
-    return "\n".join(lines) + "\n"
+    buf = io.StringIO()
+    write_merged_txt(buf)
+    return buf.getvalue()
 
 def main():
     print("📺 正在合并 M3U 文件...")
-    output_m3u.write_text(merge_m3u(), encoding="utf-8")
+    with open(output_m3u, "w", encoding="utf-8") as f:
+        write_merged_m3u(f)
 
     print("📄 正在合并 TXT 文件...")
-    output_txt.write_text(merge_txt(), encoding="utf-8")
+    with open(output_txt, "w", encoding="utf-8") as f:
+        write_merged_txt(f)
 
     print("✅ 合并完成！")
     print(f" - {output_m3u}")
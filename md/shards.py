@@ -0,0 +1,87 @@
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+
+# 分组分片输出（WRITE_GROUP_SHARDS=1 开启）：每个最终分组单独一个文件，外加一个 JSON 索引
+# 客户端 / KV 上传脚本先取 index.json，只下载或刷新 sha256 变化的分组
+WRITE_GROUP_SHARDS = os.getenv("WRITE_GROUP_SHARDS", "0") == "1"
+
+SHARD_DIR = Path("groups")
+INDEX_FILE = SHARD_DIR / "index.json"
+
+def shard_path(group: str, ext: str, taken: set = None) -> Path:
+    """分组名 -> 分片文件路径（替换文件名中不允许的字符）
+
+    替换后不同分组可能得到相同的文件名（如 "a b" 和 "a_b"），大小写不敏感的文件系统上
+    "CCTV" 和 "cctv" 也会冲突：传入 taken（本次已占用的文件名，小写）时，
+    已被占用的文件名追加分组名的短哈希，保证每个分组对应不同的文件。
+    """
+    safe_name = re.sub(r'[\\/:*?"<>|\s]', "_", group) or "_"
+    if taken is not None:
+        digest = hashlib.sha256(group.encode("utf-8")).hexdigest()
+        length = 8
+        candidate = safe_name
+        while candidate.casefold() in taken:
+            candidate = f"{safe_name}-{digest[:length]}"
+            length *= 2
+        taken.add(candidate.casefold())
+        safe_name = candidate
+    return SHARD_DIR / f"{safe_name}.{ext}"
+
+def load_index() -> dict:
+    if INDEX_FILE.exists():
+        try:
+            return json.loads(INDEX_FILE.read_text(encoding="utf-8"))
+        except ValueError:
+            pass
+    return {"groups": {}}
+
+def write_group_shards(shards: dict, ext: str):
+    """写入某种格式（txt / m3u）的全部分组分片并更新索引
+
+    shards: 分组 -> (分片完整内容, 频道数)，按输出顺序排列。
+    内容未变化的分片不重写；本次不再出现的分组会删除对应分片。
+    """
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    old_groups = load_index().get("groups", {})
+    groups = {}
+    changed = 0
+
+    taken = set()
+    for group, (content, count) in shards.items():
+        path = shard_path(group, ext, taken)
+        data = content.encode("utf-8")
+        if not path.exists() or path.read_bytes() != data:
+            path.write_bytes(data)
+            changed += 1
+        entry = dict(old_groups.get(group, {}))
+        entry[ext] = {
+            "path": path.as_posix(),
+            "channels": count,
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+        groups[group] = entry
+
+    # 删除本格式不再使用的分片（分组消失，或文件名冲突导致路径变化）；
+    # 文件名可能已分配给本次的其他分组，仍在使用的不删
+    used = {entry[ext]["path"].casefold() for entry in groups.values()}
+    for entry in old_groups.values():
+        stale = entry.get(ext, {}).get("path")
+        if stale and stale.casefold() not in used and Path(stale).exists():
+            Path(stale).unlink()
+
+    # 保留其他格式的记录，清理本格式已消失的分组
+    for group, entry in old_groups.items():
+        if group in groups:
+            continue
+        entry = {k: v for k, v in entry.items() if k != ext}
+        if entry:
+            groups[group] = entry
+
+    new_index = json.dumps({"groups": groups}, ensure_ascii=False, indent=2) + "\n"
+    if not INDEX_FILE.exists() or INDEX_FILE.read_text(encoding="utf-8") != new_index:
+        INDEX_FILE.write_text(new_index, encoding="utf-8")
+    print(f"🗂️ 已生成 {len(shards)} 个 {ext} 分组分片（{changed} 个有变化），索引: {INDEX_FILE}")
@@ -0,0 +1,77 @@
+import sys
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# upload_to_kv.py 位于仓库根目录
+sys.path.insert(0, str(ROOT))
+# md/ 下的脚本以 `python3 md/xxx.py` 方式运行，彼此按顶层模块导入
+sys.path.insert(0, str(ROOT / "md"))
+
+import http_client
+
+class FaultServer:
+    """进程内的本地 HTTP 服务：routes 中每个路径对应一个处理函数 handler(request, hit_count)"""
+
+    def __init__(self):
+        self.routes = {}
+        self.hits = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def dispatch(self):
+                # 读完请求体，否则长连接上的下一个请求会从残留的请求体开始解析
+                self.body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                server.requests.append((self.command, self.path, self.body))
+                server.hits[self.path] = server.hits.get(self.path, 0) + 1
+                route = server.routes.get(self.path)
+                if route is None:
+                    self.send_error(404)
+                    return
+                route(self, server.hits[self.path])
+
+            do_GET = do_HEAD = do_PUT = do_DELETE = dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.host = f"127.0.0.1:{self.httpd.server_address[1]}"
+        self.base = f"http://{self.host}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return self.base + path
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def send_body(handler, body: bytes, status=200, headers=None):
+    handler.send_response(status)
+    for key, value in (headers or {}).items():
+        handler.send_header(key, value)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+@pytest.fixture(autouse=True)
+def fast_client(monkeypatch):
+    """缩短退避时间，并在每个测试前后清空按主机记录的熔断状态和统计"""
+    monkeypatch.setattr(http_client, "BACKOFF_BASE", 0.01)
+    http_client._hosts.clear()
+    yield
+    http_client._hosts.clear()
+
+@pytest.fixture
+def fault_server():
+    server = FaultServer()
+    yield server
+    server.close()
@@ -0,0 +1,78 @@
+from urllib.parse import urlsplit
+
+import numpy as np
+import pytest
+
+import availability
+
+def snapshot(tmp_path, stamp, urls):
+    lines = ["#EXTM3U"]
+    for url in urls:
+        lines.append(f'#EXTINF:-1 tvg-name="CCTV1" group-title="央视频道",CCTV1')
+        lines.append(url)
+    (tmp_path / f"logo{stamp}.m3u").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+def test_new_urls_are_not_counted_as_flapping(tmp_path):
+    history = tmp_path / "history"
+    history.mkdir()
+    snapshot(history, "01010000", ["http://stable/1", "http://flaky/1"])
+    snapshot(history, "01010600", ["http://stable/1"])
+    snapshot(history, "01011200", ["http://stable/1", "http://flaky/1", "http://new/1", "http://new/2"])
+
+    index = availability.AvailabilityIndex(tmp_path / "index")
+    assert index.update(history) == 3
+
+    flapping = {host: rate for host, rate, _ in index.flapping_hosts()}
+    assert flapping == {"flaky": 2.0}
+    assert index.new_since_last_build() == [("CCTV1", "http://flaky/1"), ("CCTV1", "http://new/1"), ("CCTV1", "http://new/2")]
+
+def test_incremental_update_matches_full_build(tmp_path):
+    history = tmp_path / "history"
+    history.mkdir()
+    snapshot(history, "12311800", ["http://a/1"])
+    snapshot(history, "01010000", ["http://a/1", "http://b/1"])
+
+    full = availability.AvailabilityIndex(tmp_path / "full")
+    full.update(history)
+
+    partial = tmp_path / "partial"
+    (history / "logo01010000.m3u").rename(tmp_path / "later.m3u")
+    availability.AvailabilityIndex(partial).update(history)
+    (tmp_path / "later.m3u").rename(history / "logo01010000.m3u")
+    reloaded = availability.AvailabilityIndex(partial)
+    assert reloaded.update(history) == 1
+
+    # 跨年：12 月 31 日的快照排在 1 月 1 日之前
+    assert reloaded.snapshots == full.snapshots == ["logo12311800.m3u", "logo01010000.m3u"]
+    assert reloaded.urls == full.urls
+    assert (reloaded.matrix() == full.matrix()).all()
+    assert reloaded.uptime().tolist() == [1.0, 1.0]
+
+def test_chunked_queries_match_full_matrix(tmp_path, monkeypatch):
+    monkeypatch.setattr(availability, "CHUNK_ROWS", 3)
+    rng = np.random.default_rng(7)
+    index = availability.AvailabilityIndex(tmp_path / "index")
+    urls = [f"http://host{i % 5}/{i}" for i in range(50)]
+    for row in range(11):
+        present = rng.random(len(urls)) < 0.6
+        index.add_snapshot(f"logo{row:08d}.m3u", [("CCTV1", url) for url, on in zip(urls, present) if on])
+
+    m = index.matrix()
+    first_seen = m.argmax(axis=0)
+    assert np.allclose(index.uptime(), m.sum(axis=0) / (len(m) - first_seen))
+
+    after_first = np.arange(1, len(m))[:, None] > first_seen[None, :]
+    flips = np.count_nonzero((m[1:] != m[:-1]) & after_first, axis=0)
+    hosts = [urlsplit(url).netloc for url in index.urls]
+    expected = {}
+    for host, count in zip(hosts, flips):
+        expected.setdefault(host, []).append(count)
+    assert {host: rate for host, rate, _ in index.flapping_hosts()} == pytest.approx(
+        {host: np.mean(counts) for host, counts in expected.items() if np.mean(counts) > 0})
+
+    best = np.zeros(m.shape[1], dtype=int)
+    run = np.zeros(m.shape[1], dtype=int)
+    for row in m:
+        run = (run + 1) * row
+        best = np.maximum(best, run)
+    assert index.longest_runs().tolist() == best.tolist()
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+import build_m3u
+from conftest import send_body
+
+def playlist(*channels, newline="\n"):
+    lines = ["#EXTM3U"]
+    for name, url in channels:
+        lines.append(f'#EXTINF:-1 tvg-name="{name}" group-title="测试",{name}')
+        lines.append(url)
+    return newline.join(lines) + newline
+
+def serve(body: str, delay: float = 0):
+    def handler(h, hit):
+        time.sleep(delay)
+        send_body(h, body.encode("utf-8"), headers={"Content-Type": "audio/x-mpegurl; charset=utf-8"})
+    return handler
+
+@pytest.fixture
+def links_file(tmp_path, monkeypatch):
+    path = tmp_path / "links.txt"
+    monkeypatch.setattr(build_m3u, "LINKS_FILE_PATH", path)
+
+    def write(*urls):
+        path.write_text("\n".join(urls), encoding="utf-8")
+    return write
+
+@pytest.mark.parametrize("slow_first", [True, False])
+def test_overlapping_sources_have_deterministic_winners(fault_server, links_file, slow_first):
+    a = playlist(("CCTV1-A", "http://x/1"), ("湖南卫视", "http://x/2"))
+    b = playlist(("CCTV1-B", "http://x/1"), ("北京新闻", "http://x/3"), ("CCTV1-B2", "http://x/1"))
+    # 先列出的源后完成，或者先完成：结果都应相同
+    fault_server.routes["/a.m3u"] = serve(a, delay=0.3 if slow_first else 0)
+    fault_server.routes["/b.m3u"] = serve(b, delay=0 if slow_first else 0.3)
+    links_file(fault_server.url("/a.m3u"), fault_server.url("/b.m3u"))
+
+    channels = build_m3u.download_all_links()
+    assert [(name, url) for name, url, _, _ in channels] == [
+        ("CCTV1-A", "http://x/1"),
+        ("湖南卫视", "http://x/2"),
+        ("北京新闻", "http://x/3"),
+    ]
+
+def test_failing_and_invalid_sources_are_skipped(fault_server, links_file):
+    fault_server.routes["/ok.m3u"] = serve(playlist(("CCTV1", "http://x/1")))
+    fault_server.routes["/html"] = serve("<html>not a playlist</html>")
+    links_file(fault_server.url("/missing.m3u"), fault_server.url("/html"), fault_server.url("/ok.m3u"))
+
+    channels = build_m3u.download_all_links()
+    assert [url for _, url, _, _ in channels] == ["http://x/1"]
+
+def test_source_failing_mid_stream_contributes_nothing(fault_server, links_file):
+    body = playlist(("CCTV1", "http://x/1"), ("CCTV2", "http://x/2")).encode("utf-8")
+
+    def truncated(h, hit):
+        # 声明的长度大于实际发送的内容，然后断开连接
+        h.send_response(200)
+        h.send_header("Content-Length", str(len(body) + 1000))
+        h.end_headers()
+        h.wfile.write(body)
+        h.wfile.flush()
+        h.close_connection = True
+        h.connection.close()
+
+    fault_server.routes["/broken.m3u"] = truncated
+    fault_server.routes["/ok.m3u"] = serve(playlist(("湖南卫视", "http://x/9")))
+    links_file(fault_server.url("/broken.m3u"), fault_server.url("/ok.m3u"))
+
+    channels = build_m3u.download_all_links()
+    assert [url for _, url, _, _ in channels] == ["http://x/9"]
+
+def test_all_sources_failing_raises(fault_server, links_file):
+    fault_server.routes["/html"] = serve("<html></html>")
+    links_file(fault_server.url("/html"))
+    with pytest.raises(RuntimeError):
+        build_m3u.download_all_links()
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16, 511, 512])
+def test_crlf_across_chunk_boundaries(fault_server, monkeypatch, chunk_size):
+    monkeypatch.setattr(build_m3u, "STREAM_CHUNK_SIZE", chunk_size)
+    body = playlist(*[(f"频道{i}", f"http://x/{i}") for i in range(40)], newline="\r\n")
+    fault_server.routes["/crlf.m3u"] = serve(body)
+
+    streamed = list(build_m3u.stream_m3u_channels(fault_server.url("/crlf.m3u")))
+    assert streamed == build_m3u.parse_m3u(body)
+    assert len(streamed) == 40
+
+def test_unknown_charset_falls_back_to_utf8(fault_server):
+    body = playlist(("湖南卫视", "http://x/1")).encode("utf-8")
+    fault_server.routes["/odd.m3u"] = lambda h, hit: send_body(h, body, headers={"Content-Type": "audio/x-mpegurl; charset=x-unknown"})
+
+    streamed = list(build_m3u.stream_m3u_channels(fault_server.url("/odd.m3u")))
+    assert [(name, url) for name, url, _, _ in streamed] == [("湖南卫视", "http://x/1")]
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import daemon
+import build_m3u
+import build_m3u_add_logo
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    links = tmp_path / "links.txt"
+    links.write_text("http://a/1.m3u\n", encoding="utf-8")
+    tvlogo = tmp_path / "TVlogo_Images"
+    (tvlogo / "中央电视台").mkdir(parents=True)
+    monkeypatch.setattr(daemon, "LINKS_FILE", links)
+    monkeypatch.setattr(daemon, "TVLOGO_DIR", tvlogo)
+
+    cleared = []
+    monkeypatch.setattr(build_m3u, "clear_caches", lambda: cleared.append("build_m3u"))
+    monkeypatch.setattr(build_m3u_add_logo, "clear_caches", lambda: cleared.append("build_m3u_add_logo"))
+
+    d = daemon.PipelineDaemon()
+    d.jobs["build"].next_run = time.time() + 3600
+    return d, links, tvlogo, cleared
+
+def test_unchanged_inputs_do_nothing(pipeline):
+    d, _, _, cleared = pipeline
+    d.check_inputs()
+    assert d.jobs["build"].next_run > time.time() + 60
+    assert cleared == []
+
+def test_links_change_reschedules_build(pipeline):
+    d, links, _, cleared = pipeline
+    links.write_text("http://a/1.m3u\nhttp://b/2.m3u\n", encoding="utf-8")
+
+    d.check_inputs()
+    assert d.jobs["build"].next_run <= time.time()
+    assert cleared == ["build_m3u", "build_m3u_add_logo"]
+
+def test_tvlogo_subdirectory_change_reschedules_build(pipeline):
+    d, _, tvlogo, cleared = pipeline
+    folder = tvlogo / "中央电视台"
+    (folder / "CCTV1.png").write_bytes(b"")
+    # 保证目录修改时间确实变化（部分文件系统的时间精度较粗）
+    stat = folder.stat()
+    os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    d.check_inputs()
+    assert d.jobs["build"].next_run <= time.time()
+    assert cleared == ["build_m3u", "build_m3u_add_logo"]
+
+def test_watch_error_is_recorded_instead_of_raised(pipeline, monkeypatch):
+    d, _, _, _ = pipeline
+
+    def vanished():
+        raise FileNotFoundError("TVlogo_Images")
+    monkeypatch.setattr(daemon, "tvlogo_fingerprint", vanished)
+
+    d.check_inputs()
+    assert d.watch_errors == 1
+    assert d.health()["last_watch_error"] == "TVlogo_Images"
+
+def test_job_run_failure_accounting():
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    job = daemon.Job("demo", func, interval=60)
+    job.run()
+    status = job.status()
+    assert (status["runs"], status["failures"], status["last_error"], status["last_ok"]) == (1, 1, "boom", None)
+    assert status["next_run"] == pytest.approx(status["last_run"] + 60)
+
+    job.run()
+    status = job.status()
+    assert (status["runs"], status["failures"], status["last_error"]) == (2, 1, None)
+    assert status["last_ok"] == status["last_run"]
+
+def test_health_and_metrics_endpoints(pipeline):
+    d, _, _, _ = pipeline
+    server = ThreadingHTTPServer(("127.0.0.1", 0), daemon.make_handler(d))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(base + "/health") as r:
+            health = json.loads(r.read())
+        assert health["status"] == "ok"
+        assert set(health["jobs"]) == {"crawl", "build", "dedupe"}
+
+        with urllib.request.urlopen(base + "/metrics") as r:
+            metrics = json.loads(r.read())
+        assert set(metrics) == {"jobs", "http", "cache"}
+        assert metrics["cache"]["availability_snapshots"] == 0
+
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(base + "/missing")
+        assert e.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,27 @@
+import history
+import http_client
+from conftest import send_body
+
+def test_local_dedupe_keeps_newest_copy(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / "history"
+    folder.mkdir()
+    (folder / "logo01010000.m3u").write_text("#EXTM3U\nsame\n", encoding="utf-8")
+    (folder / "logo01010600.m3u").write_text("#EXTM3U\nsame\n", encoding="utf-8")
+    (folder / "tvbox_01010600.txt").write_text("different\n", encoding="utf-8")
+    (folder / "merged.m3u").write_text("#EXTM3U\nsame\n", encoding="utf-8")
+
+    assert history.check_local_duplicates(folder) == 1
+
+    assert sorted(f.name for f in folder.iterdir()) == ["logo01010600.m3u", "merged.m3u", "tvbox_01010600.txt"]
+    report = (tmp_path / history.OUTPUT_FILE).read_text(encoding="utf-8")
+    assert "删除文件数: 1" in report
+    assert "保留文件: " + (folder / "logo01010600.m3u").as_posix() in report
+
+def test_delete_is_not_retried(fault_server, monkeypatch):
+    fault_server.routes["/contents"] = lambda h, hit: send_body(h, b"busy", status=503)
+    real_delete = http_client.delete
+    monkeypatch.setattr(http_client, "delete", lambda url, **kwargs: real_delete(fault_server.url("/contents"), **kwargs))
+
+    assert history.delete_file("history/logo01010000.m3u", "sha") is False
+    assert fault_server.hits["/contents"] == 1
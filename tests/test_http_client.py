@@ -0,0 +1,118 @@
+import time
+import threading
+
+import pytest
+import requests
+
+import http_client
+from conftest import send_body
+
+@pytest.fixture(autouse=True)
+def fast_breaker(monkeypatch):
+    monkeypatch.setattr(http_client, "BREAKER_THRESHOLD", 3)
+    monkeypatch.setattr(http_client, "BREAKER_COOLDOWN", 0.3)
+
+def ok(handler, hit):
+    send_body(handler, b"ok")
+
+def drop(handler, hit):
+    handler.close_connection = True
+    handler.connection.close()
+
+def test_503_then_success(fault_server):
+    def flaky(handler, hit):
+        if hit < 3:
+            send_body(handler, b"busy", status=503)
+        else:
+            send_body(handler, b"ok")
+    fault_server.routes["/flaky"] = flaky
+
+    r = http_client.get(fault_server.url("/flaky"))
+    assert r.status_code == 200
+    assert fault_server.hits["/flaky"] == 3
+    assert http_client.metrics()[fault_server.host]["retries"] == 2
+
+def test_retries_exhausted_returns_last_response(fault_server):
+    fault_server.routes["/busy"] = lambda h, hit: send_body(h, b"busy", status=503)
+
+    r = http_client.get(fault_server.url("/busy"), retries=1)
+    assert r.status_code == 503
+    assert fault_server.hits["/busy"] == 2
+
+def test_429_honours_retry_after(fault_server):
+    def limited(handler, hit):
+        if hit == 1:
+            send_body(handler, b"slow down", status=429, headers={"Retry-After": "1"})
+        else:
+            send_body(handler, b"ok")
+    fault_server.routes["/limited"] = limited
+
+    start = time.monotonic()
+    r = http_client.get(fault_server.url("/limited"))
+    assert r.status_code == 200
+    assert time.monotonic() - start >= 0.9
+
+def test_dropped_connection_raises_after_retries(fault_server):
+    fault_server.routes["/drop"] = drop
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http_client.get(fault_server.url("/drop"), retries=1)
+    assert fault_server.hits["/drop"] == 2
+
+def test_breaker_opens_after_threshold(fault_server):
+    fault_server.routes["/drop"] = drop
+    fault_server.routes["/ok"] = ok
+
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            http_client.get(fault_server.url("/drop"), retries=0)
+    with pytest.raises(http_client.CircuitOpenError):
+        http_client.get(fault_server.url("/ok"))
+    assert "/ok" not in fault_server.hits
+
+def test_half_open_probe_success_closes_breaker(fault_server):
+    fault_server.routes["/drop"] = drop
+    fault_server.routes["/ok"] = ok
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            http_client.get(fault_server.url("/drop"), retries=0)
+
+    time.sleep(0.35)
+    assert http_client.get(fault_server.url("/ok")).status_code == 200
+    assert http_client.get(fault_server.url("/ok")).status_code == 200
+    assert not http_client.metrics()[fault_server.host]["circuit_open"]
+
+def test_half_open_probe_unexpected_error_does_not_latch_breaker(fault_server):
+    def loop(handler, hit):
+        send_body(handler, b"", status=302, headers={"Location": "/loop"})
+    fault_server.routes["/drop"] = drop
+    fault_server.routes["/loop"] = loop
+    fault_server.routes["/ok"] = ok
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            http_client.get(fault_server.url("/drop"), retries=0)
+
+    time.sleep(0.35)
+    with pytest.raises(requests.exceptions.TooManyRedirects):
+        http_client.get(fault_server.url("/loop"))
+    # 探测失败：熔断器重新打开，而不是永久卡在探测中
+    with pytest.raises(http_client.CircuitOpenError):
+        http_client.get(fault_server.url("/ok"))
+
+    time.sleep(0.35)
+    assert http_client.get(fault_server.url("/ok")).status_code == 200
+
+def test_stream_holds_host_slot_until_closed(fault_server, monkeypatch):
+    monkeypatch.setattr(http_client, "HOST_CONCURRENCY", 1)
+    fault_server.routes["/ok"] = ok
+
+    streamed = http_client.get(fault_server.url("/ok"), stream=True)
+    second = threading.Thread(target=http_client.get, args=(fault_server.url("/ok"),))
+    second.start()
+    second.join(0.3)
+    assert second.is_alive()
+
+    streamed.close()
+    second.join(2)
+    assert not second.is_alive()
+    assert fault_server.hits["/ok"] == 2
@@ -0,0 +1,128 @@
+from collections import defaultdict
+
+import pytest
+
+import merge_tvlist
+
+# 基线实现（流式改写之前的 merge_m3u / merge_txt），作为逐字节对照
+def baseline_merge_m3u(folder):
+    all_entries = []
+    for f in folder.glob("*.m3u"):
+        if f.name.startswith("merged."):
+            continue
+        all_entries.extend(merge_tvlist.extract_m3u(f))
+
+    seen = set()
+    unique = []
+    for extinf, url in all_entries:
+        if url not in seen:
+            seen.add(url)
+            unique.append((extinf.strip(), url.strip()))
+
+    cctv, weishi, others = [], [], []
+    for extinf, url in unique:
+        if "央视频道" in extinf:
+            cctv.append((extinf, url))
+        elif "卫视频道" in extinf:
+            weishi.append((extinf, url))
+        else:
+            others.append((extinf, url))
+
+    lines = [merge_tvlist.tvg_header]
+    for extinf, url in cctv + weishi + others:
+        lines.append(extinf)
+        lines.append(url)
+    return "\n".join(lines) + "\n"
+
+def baseline_merge_txt(folder):
+    all_entries = []
+    for f in folder.glob("*.txt"):
+        if f.name.startswith("merged."):
+            continue
+        all_entries.extend(merge_tvlist.extract_txt(f))
+
+    seen = set()
+    grouped = defaultdict(list)
+    for group, name, url in all_entries:
+        key = (name, url)
+        if key not in seen:
+            seen.add(key)
+            grouped[group].append((name, url))
+
+    ordered_groups = []
+    for title in ["央视频道", "卫视频道"]:
+        if title in grouped:
+            ordered_groups.append((title, grouped.pop(title)))
+    ordered_groups += sorted(grouped.items())
+
+    lines = []
+    for group, channels in ordered_groups:
+        lines.append(f"📺{group},#genre#")
+        for name, url in channels:
+            lines.append(f"{name},{url}")
+    return "\n".join(lines) + "\n"
+
+def m3u(*channels):
+    lines = ["#EXTM3U"]
+    for name, group, url in channels:
+        lines.append(f'#EXTINF:-1 tvg-name="{name}" group-title="{group}",{name}')
+        lines.append(url)
+    return "\n".join(lines) + "\n"
+
+def write_fixture_history(folder):
+    folder.mkdir(exist_ok=True)
+    (folder / "logo01010000.m3u").write_text(m3u(
+        ("CCTV1", "央视频道", "http://a/1"),
+        ("湖南卫视", "卫视频道", "http://a/2"),
+        ("北京新闻", "地方频道", "http://a/3"),
+    ), encoding="utf-8")
+    # 与上一个文件重复的链接（频道名不同也按链接去重），外加 CRLF 换行
+    (folder / "logo01010600.m3u").write_text(m3u(
+        ("CCTV1 高清", "央视频道", "http://a/1"),
+        ("CCTV2", "央视频道", "http://b/1"),
+        ("浙江卫视", "卫视频道", "http://a/2"),
+        ("某电影", "其他", "http://b/2"),
+    ).replace("\n", "\r\n"), encoding="utf-8")
+    (folder / "tvbox_01010000.txt").write_text(
+        "📺央视频道,#genre#\nCCTV1,http://a/1\n📺地方频道,#genre#\n北京新闻,http://a/3\n", encoding="utf-8")
+    (folder / "tvbox_01010600.txt").write_text(
+        "没有分组,http://c/1\n📺卫视频道,#genre#\n湖南卫视,http://a/2\n📺央视频道,#genre#\n"
+        "CCTV1,http://a/1\nCCTV1 备用,http://a/1\n📺少儿频道,#genre#\n卡通,http://c/2\n", encoding="utf-8")
+    # 之前的合并结果不参与合并
+    (folder / "merged.m3u").write_text(m3u(("旧", "其他", "http://old/1")), encoding="utf-8")
+    (folder / "merged.txt").write_text("📺旧,#genre#\n旧,http://old/1\n", encoding="utf-8")
+
+@pytest.mark.parametrize("populated", [True, False])
+@pytest.mark.parametrize("spill", [False, True])
+def test_streaming_merge_matches_baseline(tmp_path, monkeypatch, populated, spill):
+    folder = tmp_path / "history"
+    folder.mkdir()
+    if populated:
+        write_fixture_history(folder)
+    monkeypatch.setattr(merge_tvlist, "folder", folder)
+    monkeypatch.setattr(merge_tvlist, "RANK_BY_UPTIME", False)
+    # 落盘目录不存在时自动创建
+    monkeypatch.setattr(merge_tvlist, "SPILL_DIR", str(tmp_path / "spill" / "nested") if spill else None)
+
+    assert merge_tvlist.merge_m3u() == baseline_merge_m3u(folder)
+    assert merge_tvlist.merge_txt() == baseline_merge_txt(folder)
+    if populated:
+        assert "http://old/1" not in merge_tvlist.merge_m3u()
+        assert merge_tvlist.merge_txt().count("CCTV1,http://a/1") == 1
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_digest_set_grows_without_losing_keys(tmp_path, spill):
+    spill_dir = str(tmp_path) if spill else None
+    seen = merge_tvlist.DigestSet(capacity=4, spill_dir=spill_dir)
+    keys = [f"http://host/{i}" for i in range(1000)]
+
+    assert all(seen.add(key) for key in keys)
+    assert len(seen.table) >= 2048
+    assert not any(seen.add(key) for key in keys)
+    assert seen.size == len(keys)
+    if spill:
+        # 扩容后旧的 memmap 文件已删除，只剩当前表
+        assert len(list(tmp_path.glob("*.digests"))) == 1
+
+    seen.close()
+    assert list(tmp_path.glob("*.digests")) == []
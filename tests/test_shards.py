@@ -0,0 +1,107 @@
+import json
+import hashlib
+from pathlib import Path
+
+import pytest
+
+import shards
+import build_m3u
+import build_m3u_add_logo
+
+CHANNELS = [
+    ("CCTV1", "http://x/1", "", ""),
+    ("湖南卫视", "http://x/2", "", ""),
+    ("CCTV2", "http://x/3", "", ""),
+    ("北京新闻", "http://x/4", "", ""),
+]
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "TVlogo_Images" / "中央电视台").mkdir(parents=True)
+    (tmp_path / "TVlogo_Images" / "中央电视台" / "CCTV1.png").write_bytes(b"")
+    build_m3u.clear_caches()
+    build_m3u_add_logo.clear_caches()
+    yield tmp_path
+    build_m3u.clear_caches()
+    build_m3u_add_logo.clear_caches()
+
+def build(monkeypatch, enabled):
+    monkeypatch.setattr(build_m3u, "WRITE_GROUP_SHARDS", enabled)
+    monkeypatch.setattr(build_m3u_add_logo, "WRITE_GROUP_SHARDS", enabled)
+    build_m3u.generate_tvbox_txt(CHANNELS)
+    build_m3u.generate_output_with_logo(CHANNELS)
+    # build_m3u_add_logo 读取的 output.m3u 由 build_m3u 生成
+    Path(build_m3u_add_logo.INPUT_FILE).write_text(Path(build_m3u.OUTPUT_WITH_LOGO_FILE).read_text(encoding="utf-8"), encoding="utf-8")
+    build_m3u_add_logo.main()
+    return {name: Path(name).read_bytes() for name in (build_m3u.TVBOX_TXT_FILE, build_m3u_add_logo.OUTPUT_FILE)}
+
+def read_index():
+    return json.loads(shards.INDEX_FILE.read_text(encoding="utf-8"))["groups"]
+
+def test_combined_outputs_unchanged_and_index_matches_shards(monkeypatch, workdir):
+    plain = build(monkeypatch, False)
+    assert not shards.SHARD_DIR.exists()
+    for name in plain:
+        (workdir / name).unlink()
+
+    assert build(monkeypatch, True) == plain
+
+    groups = read_index()
+    assert list(groups) == ["央视频道", "卫视频道", "地方频道"]
+    assert {group: entry["txt"]["channels"] for group, entry in groups.items()} == {"央视频道": 2, "卫视频道": 1, "地方频道": 1}
+    assert shards.shard_path("央视频道", "txt").read_text(encoding="utf-8") == "📺央视频道,#genre#\nCCTV1,http://x/1\nCCTV2,http://x/3"
+    m3u = shards.shard_path("卫视频道", "m3u").read_text(encoding="utf-8").splitlines()
+    assert m3u[0] == build_m3u_add_logo.M3U_HEADER
+    assert m3u[2:] == ["http://x/2"]
+
+    for entry in groups.values():
+        for ext in ("txt", "m3u"):
+            data = (workdir / entry[ext]["path"]).read_bytes()
+            assert entry[ext]["bytes"] == len(data)
+            assert entry[ext]["sha256"] == hashlib.sha256(data).hexdigest()
+
+    # 各格式的分片拼起来与合并文件的频道一致
+    txt_lines = [line for entry in groups.values() for line in (workdir / entry["txt"]["path"]).read_text(encoding="utf-8").split("\n")]
+    assert txt_lines == plain[build_m3u.TVBOX_TXT_FILE].decode("utf-8").split("\n")
+
+def test_unchanged_shards_are_not_rewritten(workdir):
+    shards.write_group_shards({"A": ("a\n", 1), "B": ("b\n", 1)}, "txt")
+    before = {path.name: path.stat().st_mtime_ns for path in shards.SHARD_DIR.iterdir()}
+    index_before = shards.INDEX_FILE.read_bytes()
+
+    shards.write_group_shards({"A": ("a\n", 1), "B": ("b2\n", 1)}, "txt")
+
+    assert shards.shard_path("A", "txt").stat().st_mtime_ns == before["A.txt"]
+    assert shards.shard_path("B", "txt").read_text(encoding="utf-8") == "b2\n"
+    assert shards.INDEX_FILE.read_bytes() != index_before
+
+def test_vanished_groups_are_removed_but_other_format_is_kept(workdir):
+    shards.write_group_shards({"A": ("a\n", 1), "B": ("b\n", 1)}, "txt")
+    shards.write_group_shards({"A": ("#a\n", 1), "B": ("#b\n", 1)}, "m3u")
+
+    shards.write_group_shards({"A": ("a\n", 1)}, "txt")
+
+    groups = read_index()
+    assert set(groups["A"]) == {"txt", "m3u"}
+    assert set(groups["B"]) == {"m3u"}
+    assert not shards.shard_path("B", "txt").exists()
+    assert shards.shard_path("B", "m3u").exists()
+
+    shards.write_group_shards({"A": ("#a\n", 1)}, "m3u")
+    assert "B" not in read_index()
+    assert not shards.shard_path("B", "m3u").exists()
+
+def test_colliding_group_names_get_distinct_files(workdir):
+    shards.write_group_shards({"a b": ("1\n", 1), "a_b": ("2\n", 1), "A_B": ("3\n", 1)}, "txt")
+
+    groups = read_index()
+    paths = [groups[group]["txt"]["path"] for group in ("a b", "a_b", "A_B")]
+    assert len({path.casefold() for path in paths}) == 3
+    assert paths[0] == "groups/a_b.txt"
+    assert [(workdir / path).read_text(encoding="utf-8") for path in paths] == ["1\n", "2\n", "3\n"]
+
+    # 冲突的分组消失后，仍在使用的文件不会被当作过期分片删除
+    shards.write_group_shards({"a_b": ("2\n", 1)}, "txt")
+    assert (workdir / read_index()["a_b"]["txt"]["path"]).read_text(encoding="utf-8") == "2\n"
+    assert sorted(path.name for path in shards.SHARD_DIR.glob("*.txt")) == ["a_b.txt"]
@@ -0,0 +1,56 @@
+import time
+from urllib.parse import quote
+
+import pytest
+
+import http_client
+import upload_to_kv
+from conftest import send_body
+
+def test_open_circuit_is_raised_unchanged(fault_server):
+    fault_server.routes["/kv"] = lambda h, hit: send_body(h, b"ok")
+    state = http_client.host_state(fault_server.url("/kv"))
+    state.failures = http_client.BREAKER_THRESHOLD
+    state.open_until = time.monotonic() + 60
+
+    with pytest.raises(http_client.CircuitOpenError):
+        upload_to_kv.safe_put(fault_server.url("/kv"), {}, b"data")
+    assert "/kv" not in fault_server.hits
+
+@pytest.fixture
+def kv(fault_server, monkeypatch):
+    monkeypatch.setattr(upload_to_kv, "KV_API_BASE", fault_server.base)
+    monkeypatch.setenv("KV_ACCOUNT_ID", "acc")
+    monkeypatch.setenv("KV_NAMESPACE_ID", "ns")
+    monkeypatch.setenv("KV_API_TOKEN", "token")
+    prefix = "/accounts/acc/storage/kv/namespaces/ns/values/"
+
+    def accept(*keys):
+        for key in keys:
+            fault_server.routes[prefix + quote(key, safe="")] = lambda h, hit: send_body(h, b"{}")
+    return accept
+
+def test_build_outputs_are_force_uploaded_unchanged(tmp_path, fault_server, kv):
+    keys = upload_to_kv.BUILD_OUTPUT_FILES + ["history/logo01010000.m3u", "history/tvbox_01010000.txt"]
+    (tmp_path / "history").mkdir()
+    for key in keys:
+        if key != "missing_logos.txt":
+            (tmp_path / key).write_bytes(f"content of {key}\n".encode("utf-8"))
+    kv(*keys)
+
+    upload_to_kv.upload_build_outputs("01010000", local_dir=str(tmp_path))
+
+    puts = {path.rsplit("/", 1)[1]: body for method, path, body in fault_server.requests if method == "PUT"}
+    assert puts == {quote(key, safe=""): f"content of {key}\n".encode("utf-8") for key in keys if key != "missing_logos.txt"}
+    # 不再逐个 HEAD 检查是否已存在
+    assert all(method == "PUT" for method, _, _ in fault_server.requests)
+
+def test_failed_upload_is_reported_after_trying_every_file(tmp_path, fault_server, kv, monkeypatch):
+    monkeypatch.setattr(upload_to_kv, "BUILD_OUTPUT_FILES", ["a.txt", "b.txt"])
+    (tmp_path / "a.txt").write_text("a", encoding="utf-8")
+    (tmp_path / "b.txt").write_text("b", encoding="utf-8")
+    kv("b.txt")
+
+    with pytest.raises(RuntimeError, match="a.txt"):
+        upload_to_kv.upload_build_outputs(local_dir=str(tmp_path))
+    assert [path.rsplit("/", 1)[1] for method, path, _ in fault_server.requests] == ["a.txt", "b.txt"]
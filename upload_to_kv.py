@@ -1,43 +1,102 @@
 import os
+import sys
+import json
 import requests
 import time
+from urllib.parse import quote
 from concurrent.futures import ThreadPoolExecutor
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "md"))
+import http_client
+
 # ---------------- 配置 ----------------
 LOCAL_DIR = "./"  # 当前仓库路径
 MAX_THREADS = 4           # 并发上传线程数
 OVERWRITE_EXISTING = False  # True = 覆盖已存在 KV，False = 跳过
 EXCLUDE_FOLDERS = ['img', 'TVlogo_Images', 'md']  # 需要排除的文件夹
 VALID_EXTENSIONS = ['.txt', '.md', '.json', '.m3u']  # 允许上传的文件扩展名，包括 .m3u 文件
+GROUP_DIR = "groups"  # 分组分片目录，按 index.json 中的 sha256 只上传有变化的分组
+GROUP_INDEX_KEY = f"{GROUP_DIR}/index.json"
+KV_API_BASE = "https://api.cloudflare.com/client/v4"
+# 每次构建都强制覆盖的输出文件，与 build_m3u.yml 上传步骤的列表一致
+BUILD_OUTPUT_FILES = [
+    "output.m3u",
+    "output_with_logo.m3u",
+    "tvbox_output.txt",
+    "missing_logos.txt",
+    "history/merged.m3u",
+    "history/merged.txt",
+]
 
 # ---------------- 函数 ----------------
-def kv_key_exists(key):
-    url = f"https://api.cloudflare.com/client/v4/accounts/{os.getenv('KV_ACCOUNT_ID')}/storage/kv/namespaces/{os.getenv('KV_NAMESPACE_ID')}/values/{key}"
+def kv_request_args(key):
+    """KV 值接口的 URL 和请求头；key 整体 URL 编码（history/ 中的 / 也编码），与工作流中的 curl 一致"""
+    url = f"{KV_API_BASE}/accounts/{os.getenv('KV_ACCOUNT_ID')}/storage/kv/namespaces/{os.getenv('KV_NAMESPACE_ID')}/values/{quote(key, safe='')}"
     headers = {"Authorization": f"Bearer {os.getenv('KV_API_TOKEN')}"}
+    return url, headers
+
+def kv_key_exists(key):
+    url, headers = kv_request_args(key)
     try:
-        res = requests.head(url, headers=headers, timeout=20)
+        res = http_client.head(url, headers=headers, timeout=20)
         return res.status_code == 200
     except requests.exceptions.RequestException:
         return False
 
-def safe_put(url, headers, data, retries=5, delay=1):
-    for i in range(retries):
-        try:
-            res = requests.put(url, headers=headers, data=data, timeout=30)
-            res.raise_for_status()
-            return res
-        except (requests.exceptions.SSLError, requests.exceptions.ConnectionError) as e:
-            print(f"⚠️ 上传失败，重试 {i+1}/{retries}：{e}")
-            time.sleep(delay)
-    raise Exception(f"❌ 上传失败超过 {retries} 次：{url}")
+def fetch_kv_json(key):
+    url, headers = kv_request_args(key)
+    try:
+        res = http_client.get(url, headers=headers, timeout=20)
+        if res.status_code == 200:
+            return res.json()
+    except (requests.exceptions.RequestException, ValueError):
+        pass
+    return {}
+
+def safe_put(url, headers, data, retries=5):
+    # 重试、退避和熔断由 http_client 处理
+    try:
+        res = http_client.put(url, headers=headers, data=data, timeout=30, retries=retries - 1)
+    except http_client.CircuitOpenError:
+        # 主机已熔断，请求根本没有发出，原样抛出
+        raise
+    except (requests.exceptions.SSLError, requests.exceptions.ConnectionError) as e:
+        raise Exception(f"❌ 上传失败超过 {retries} 次：{url}") from e
+    res.raise_for_status()
+    return res
 
 def upload_to_kv(key, value):
-    url = f"https://api.cloudflare.com/client/v4/accounts/{os.getenv('KV_ACCOUNT_ID')}/storage/kv/namespaces/{os.getenv('KV_NAMESPACE_ID')}/values/{key}"
-    headers = {"Authorization": f"Bearer {os.getenv('KV_API_TOKEN')}"}
+    url, headers = kv_request_args(key)
     safe_put(url, headers, value)
     print(f"✅ 上传成功: {key}")
 
+def upload_group_shards(local_dir):
+    """对比 KV 中的分组索引，只上传 sha256 变化的分片，最后上传索引"""
+    index_path = os.path.join(local_dir, GROUP_INDEX_KEY)
+    if not os.path.exists(index_path):
+        return
+    with open(index_path, "rb") as f:
+        index_content = f.read()
+    local_groups = json.loads(index_content).get("groups", {})
+    remote_groups = fetch_kv_json(GROUP_INDEX_KEY).get("groups", {})
+
+    for group, entry in local_groups.items():
+        for ext, info in entry.items():
+            remote = remote_groups.get(group, {}).get(ext, {})
+            # 文件名冲突时分片路径可能变化：路径和 sha256 都相同才跳过
+            if remote.get("sha256") == info["sha256"] and remote.get("path") == info["path"]:
+                print(f"⏭ 分组未变化: {info['path']}")
+                continue
+            # 分片原样上传（不追加时间戳），保证内容与索引中的 sha256 一致
+            with open(os.path.join(local_dir, info["path"]), "rb") as f:
+                upload_to_kv(info["path"], f.read())
+    upload_to_kv(GROUP_INDEX_KEY, index_content)
+
 def process_file(local_file, key):
+    # 分组分片由 upload_group_shards 单独处理
+    if key.startswith(f"{GROUP_DIR}/"):
+        return
+
     # 排除指定文件夹
     if any(exclude in local_file for exclude in EXCLUDE_FOLDERS):
         print(f"⏭ 跳过文件夹: {local_file}")
@@ -74,8 +133,42 @@ def upload_local_dir(local_dir, prefix=""):
         for t in tasks:
             t.result()
 
+def upload_build_outputs(timestamp=None, local_dir=LOCAL_DIR):
+    """强制上传本次构建的输出（原样内容，不检查 KV 中是否已存在），再同步分组分片
+
+    与 build_m3u.yml 的上传步骤相同：BUILD_OUTPUT_FILES 加上本次的
+    history/logo<TIMESTAMP>.m3u 和 history/tvbox_<TIMESTAMP>.txt。常驻进程每次构建后调用。
+    """
+    keys = list(BUILD_OUTPUT_FILES)
+    if timestamp:
+        keys += [f"history/logo{timestamp}.m3u", f"history/tvbox_{timestamp}.txt"]
+
+    failed = []
+    for key in keys:
+        local_file = os.path.join(local_dir, key)
+        if not os.path.isfile(local_file):
+            print(f"⚠️ 跳过（文件不存在）：{key}")
+            continue
+        with open(local_file, "rb") as f:
+            content = f.read()
+        try:
+            upload_to_kv(key, content)
+        except Exception as e:
+            print(f"❌ 上传失败 {key}: {e}")
+            failed.append(key)
+    upload_group_shards(local_dir)
+    http_client.print_metrics()
+    if failed:
+        raise RuntimeError(f"{len(failed)} 个文件上传失败: {', '.join(failed)}")
+
 # ---------------- 主程序 ----------------
-start = time.time()
-print("🚀 开始同步 GitHub 仓库到 Cloudflare KV...")
-upload_local_dir(LOCAL_DIR)
-print(f"🎉 同步完成！耗时 {time.time() - start:.1f} 秒")
+def main():
+    start = time.time()
+    print("🚀 开始同步 GitHub 仓库到 Cloudflare KV...")
+    upload_local_dir(LOCAL_DIR)
+    upload_group_shards(LOCAL_DIR)
+    http_client.print_metrics()
+    print(f"🎉 同步完成！耗时 {time.time() - start:.1f} 秒")
+
+if __name__ == "__main__":
+    main()